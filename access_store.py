@@ -0,0 +1,360 @@
+"""
+Access Store
+Who bought the toolkit, their access token and when their access expires.
+
+Two backends share one interface:
+- SQLiteAccessStore (default): survives restarts and is shared by every
+  worker process. WAL mode lets readers run alongside the single writer;
+  email is the primary key and access token / session id are indexed.
+- MemoryAccessStore: the old per-process dict, for local experiments.
+
+open_access_store() picks one from the environment:
+  ACCESS_STORE=sqlite|memory   (default sqlite)
+  ACCESS_DB_PATH=/path/to.db   (default .data/access.db next to this file)
+
+Records are dicts: {'email', 'access_token', 'expires' (datetime), 'session_id'}.
+Every lookup counts as a hit or a miss in access_store_lookups_total.
+
+Both keep grants ordered by expiry (an index on `expires`, or a heap), and
+an ExpirySweeper thread moves grants that expired a while ago to an archive
+in small batches, so the live table and its indexes only hold current
+customers. The archive keeps only checkout session -> email and expiry (no
+access token), so an old /success link is recognised as expired rather than
+fulfilled again; archived records come back with access_token None. After
+a retention period the sweeper deletes them too. By then stripe_server.py
+refuses the checkout session as older than the access it bought.
+"""
+
+import os
+import heapq
+import random
+import secrets
+import sqlite3
+import threading
+from datetime import datetime, timedelta
+from functools import wraps
+
+from metrics import Counter
+from process_local import LocalConnections, BackgroundThreads
+
+DEFAULT_DB_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.data', 'access.db')
+
+ACCESS_LOOKUPS = Counter(
+    'access_store_lookups_total', 'Access store reads, by lookup and whether a record was found', ('lookup', 'result'))
+
+
+ACCESS_ARCHIVED = Counter('access_grants_archived_total', 'Expired grants moved to the archive by the sweeper')
+ACCESS_PRUNED = Counter('access_expired_pruned_total', 'Archived sessions deleted after the retention period')
+
+SWEEP_BATCH = 500  # Grants archived per transaction
+
+
+def counted(lookup):
+    """Count a lookup method's hits and misses"""
+    hit, miss = ACCESS_LOOKUPS.labels(lookup, 'hit'), ACCESS_LOOKUPS.labels(lookup, 'miss')
+
+    def decorate(method):
+        @wraps(method)
+        def wrapper(self, value):
+            record = method(self, value)
+            (miss if record is None else hit).inc()
+            return record
+        return wrapper
+    return decorate
+
+
+class AccessStore:
+    """Interface every backend implements."""
+
+    def grant(self, email, access_token, expires, session_id):
+        """Give `email` access until `expires`, replacing any earlier grant."""
+        raise NotImplementedError
+
+    def fulfil(self, email, session_id, expires):
+        """Grant access for checkout `session_id` once. Repeats (Stripe
+        retries, /success reloads, webhook and /success racing) get the
+        existing grant back instead of a new access token."""
+        raise NotImplementedError
+
+    def get(self, email):
+        """The record for `email`, or None."""
+        raise NotImplementedError
+
+    def find_by_token(self, access_token):
+        raise NotImplementedError
+
+    def find_by_session(self, session_id):
+        """The grant made for a checkout session, archived or not."""
+        raise NotImplementedError
+
+    def sweep(self, before, limit=SWEEP_BATCH):
+        """Archive up to `limit` grants that expired before `before`; returns how many."""
+        raise NotImplementedError
+
+    def prune_archive(self, before, limit=SWEEP_BATCH):
+        """Delete up to `limit` archived sessions archived before `before`; returns how many."""
+        raise NotImplementedError
+
+    def stats(self):
+        """{'active': live grants, 'archived': archived grants}"""
+        raise NotImplementedError
+
+
+class MemoryAccessStore(AccessStore):
+    """Process-local dicts; everything is lost on restart."""
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.by_email = {}
+        self.by_token = {}
+        self.by_session = {}
+        self.expiry = []  # Heap of (expires, email, access_token); replaced grants are skipped when popped
+        self.archive = {}  # session_id -> archived record (no token), in archiving order
+
+    def grant(self, email, access_token, expires, session_id):
+        record = {'email': email, 'access_token': access_token, 'expires': expires, 'session_id': session_id}
+        with self.lock:
+            old = self.by_email.get(email)
+            if old:
+                self._remove(old)
+            self.by_email[email] = record
+            self.by_token[access_token] = record
+            if session_id:
+                self.by_session[session_id] = record
+            heapq.heappush(self.expiry, (expires, email, access_token))
+            if len(self.expiry) > 2 * len(self.by_email) + 64:
+                # Mostly replaced grants: rebuild from the live ones
+                self.expiry = [(r['expires'], r['email'], r['access_token']) for r in self.by_email.values()]
+                heapq.heapify(self.expiry)
+        return record
+
+    def _remove(self, record):
+        self.by_token.pop(record['access_token'], None)
+        self.by_session.pop(record['session_id'], None)
+
+    def fulfil(self, email, session_id, expires):
+        with self.lock:
+            record = self.by_session.get(session_id) or self.archive.get(session_id)
+            if record is not None and record['email'] == email:
+                return record
+            return self.grant(email, secrets.token_urlsafe(32), expires, session_id)
+
+    @counted('get')
+    def get(self, email):
+        return self.by_email.get(email)
+
+    @counted('find_by_token')
+    def find_by_token(self, access_token):
+        return self.by_token.get(access_token)
+
+    @counted('find_by_session')
+    def find_by_session(self, session_id):
+        return self.by_session.get(session_id) or self.archive.get(session_id)
+
+    def sweep(self, before, limit=SWEEP_BATCH):
+        archived = 0
+        with self.lock:
+            while self.expiry and self.expiry[0][0] < before and archived < limit:
+                _, email, access_token = heapq.heappop(self.expiry)
+                record = self.by_email.get(email)
+                if record is None or record['access_token'] != access_token:
+                    continue  # Replaced by a later grant
+                del self.by_email[email]
+                self._remove(record)
+                if record['session_id']:
+                    self.archive[record['session_id']] = {
+                        'email': email, 'access_token': None, 'expires': record['expires'],
+                        'session_id': record['session_id'], 'archived_at': datetime.now(),
+                    }
+                archived += 1
+        return archived
+
+    def prune_archive(self, before, limit=SWEEP_BATCH):
+        pruned = 0
+        with self.lock:
+            for session_id, record in list(self.archive.items())[:limit]:
+                if record['archived_at'] >= before:
+                    break
+                del self.archive[session_id]
+                pruned += 1
+        return pruned
+
+    def stats(self):
+        with self.lock:
+            return {'active': len(self.by_email), 'archived': len(self.archive)}
+
+
+class SQLiteAccessStore(AccessStore):
+    """SQLite in WAL mode. Each thread of each process gets its own
+    connection (sqlite3 connections must not cross threads or a fork), and
+    the statements below are constant so sqlite3 reuses them prepared."""
+
+    SCHEMA = (
+        """CREATE TABLE IF NOT EXISTS access (
+            email TEXT PRIMARY KEY,
+            access_token TEXT NOT NULL,
+            session_id TEXT,
+            expires TEXT NOT NULL
+        )""",
+        "CREATE UNIQUE INDEX IF NOT EXISTS access_token_idx ON access (access_token)",
+        "CREATE INDEX IF NOT EXISTS access_session_idx ON access (session_id)",
+        # ISO timestamps sort in time order, so this orders grants by expiry
+        "CREATE INDEX IF NOT EXISTS access_expires_idx ON access (expires)",
+        # Expired checkout sessions: enough to recognise an old /success link
+        """CREATE TABLE IF NOT EXISTS access_expired (
+            session_id TEXT PRIMARY KEY,
+            email TEXT NOT NULL,
+            expires TEXT NOT NULL,
+            archived_at TEXT NOT NULL
+        )""",
+        "CREATE INDEX IF NOT EXISTS access_expired_archived_idx ON access_expired (archived_at)",
+    )
+    COLUMNS = 'email, access_token, session_id, expires'
+    GRANT_SQL = (
+        "INSERT INTO access (email, access_token, session_id, expires) VALUES (?, ?, ?, ?) "
+        "ON CONFLICT (email) DO UPDATE SET access_token = excluded.access_token, "
+        "session_id = excluded.session_id, expires = excluded.expires"
+    )
+    # Same upsert, but a grant for the same session is left untouched
+    FULFIL_SQL = GRANT_SQL + " WHERE access.session_id IS NOT excluded.session_id"
+    GET_SQL = f"SELECT {COLUMNS} FROM access WHERE email = ?"
+    BY_TOKEN_SQL = f"SELECT {COLUMNS} FROM access WHERE access_token = ?"
+    BY_SESSION_SQL = f"SELECT {COLUMNS} FROM access WHERE session_id = ?"
+    ARCHIVED_SESSION_SQL = "SELECT email, NULL, session_id, expires FROM access_expired WHERE session_id = ?"
+    # Both statements pick the same batch: the oldest expiries, off the index
+    EXPIRED_BATCH = "SELECT email FROM access WHERE expires < ? ORDER BY expires LIMIT ?"
+    ARCHIVE_SQL = ("INSERT OR REPLACE INTO access_expired (session_id, email, expires, archived_at) "
+                   f"SELECT session_id, email, expires, ? FROM access "
+                   f"WHERE session_id IS NOT NULL AND email IN ({EXPIRED_BATCH})")
+    DELETE_EXPIRED_SQL = f"DELETE FROM access WHERE email IN ({EXPIRED_BATCH})"
+    PRUNE_ARCHIVE_SQL = ("DELETE FROM access_expired WHERE session_id IN "
+                         "(SELECT session_id FROM access_expired WHERE archived_at < ? ORDER BY archived_at LIMIT ?)")
+    STATS_SQL = "SELECT (SELECT COUNT(*) FROM access), (SELECT COUNT(*) FROM access_expired)"
+
+    def __init__(self, path=DEFAULT_DB_PATH):
+        self.path = path
+        # NORMAL is safe with WAL; fsyncs at checkpoints
+        self.connections = LocalConnections(path, self.SCHEMA, synchronous='NORMAL')
+
+    def connection(self):
+        return self.connections.get()
+
+    def _row(self, row):
+        if row is None:
+            return None
+        email, access_token, session_id, expires = row
+        return {
+            'email': email,
+            'access_token': access_token,
+            'expires': datetime.fromisoformat(expires),
+            'session_id': session_id,
+        }
+
+    def _one(self, sql, value):
+        return self._row(self.connection().execute(sql, (value,)).fetchone())
+
+    def grant(self, email, access_token, expires, session_id):
+        with self.connection() as conn:
+            conn.execute(self.GRANT_SQL, (email, access_token, session_id, expires.isoformat()))
+        return {'email': email, 'access_token': access_token, 'expires': expires, 'session_id': session_id}
+
+    def fulfil(self, email, session_id, expires):
+        with self.connection() as conn:
+            archived = conn.execute(self.ARCHIVED_SESSION_SQL, (session_id,)).fetchone()
+            if archived is not None:
+                return self._row(archived)  # Fulfilled long ago and expired since
+            conn.execute(self.FULFIL_SQL, (email, secrets.token_urlsafe(32), session_id, expires.isoformat()))
+            return self._row(conn.execute(self.GET_SQL, (email,)).fetchone())
+
+    @counted('get')
+    def get(self, email):
+        return self._one(self.GET_SQL, email)
+
+    @counted('find_by_token')
+    def find_by_token(self, access_token):
+        return self._one(self.BY_TOKEN_SQL, access_token)
+
+    @counted('find_by_session')
+    def find_by_session(self, session_id):
+        return self._one(self.BY_SESSION_SQL, session_id) or self._one(self.ARCHIVED_SESSION_SQL, session_id)
+
+    def sweep(self, before, limit=SWEEP_BATCH):
+        cutoff = before.isoformat()
+        with self.connection() as conn:
+            conn.execute(self.ARCHIVE_SQL, (datetime.now().isoformat(), cutoff, limit))
+            return conn.execute(self.DELETE_EXPIRED_SQL, (cutoff, limit)).rowcount
+
+    def prune_archive(self, before, limit=SWEEP_BATCH):
+        with self.connection() as conn:
+            return conn.execute(self.PRUNE_ARCHIVE_SQL, (before.isoformat(), limit)).rowcount
+
+    def stats(self):
+        active, archived = self.connection().execute(self.STATS_SQL).fetchone()
+        return {'active': active, 'archived': archived}
+
+
+def open_access_store():
+    """The store configured by ACCESS_STORE / ACCESS_DB_PATH."""
+    kind = os.environ.get('ACCESS_STORE', 'sqlite').lower()
+    if kind == 'memory':
+        return MemoryAccessStore()
+    if kind == 'sqlite':
+        return SQLiteAccessStore(os.environ.get('ACCESS_DB_PATH') or DEFAULT_DB_PATH)
+    raise ValueError(f"Unknown ACCESS_STORE {kind!r} (use 'sqlite' or 'memory')")
+
+
+class ExpirySweeper:
+    """Background thread that archives grants expired more than `grace` ago,
+    and deletes archived sessions once they are `retention` old.
+
+    Runs every `interval` seconds (with jitter, so worker processes do not
+    sweep in step) and archives in batches of SWEEP_BATCH, each its own short
+    transaction, so requests are never blocked behind one large delete. A
+    grace period lets a returning customer still see "access expired" rather
+    than "invalid credentials" for a while."""
+
+    def __init__(self, store, interval=60 * 60, grace=timedelta(days=30), retention=timedelta(days=90)):
+        self.store = store
+        self.interval = interval
+        self.grace = grace
+        self.retention = retention
+        self.background = BackgroundThreads(self._run, ['access-sweeper'])
+        self.stopping = self.background.stopping
+
+    def ensure_started(self):
+        """Start the sweeper in this process (again after a fork)."""
+        self.background.ensure_started()
+
+    def stop(self, timeout=10):
+        self.background.stop(timeout)
+
+    def sweep(self):
+        """Archive everything that is due, then prune the archive, batch by
+        batch; returns (archived, pruned)."""
+        now = datetime.now()
+        archived = self._batches(self.store.sweep, now - self.grace)
+        pruned = self._batches(self.store.prune_archive, now - self.retention)
+        ACCESS_ARCHIVED.inc(archived)
+        ACCESS_PRUNED.inc(pruned)
+        return archived, pruned
+
+    def _batches(self, step, cutoff):
+        total = 0
+        while not self.stopping.is_set():
+            done = step(cutoff)
+            total += done
+            if done < SWEEP_BATCH:
+                break
+        return total
+
+    def _run(self):
+        # First sweep soon after start: recycled workers may not live a full interval
+        delay = random.uniform(0, min(self.interval, 60))
+        while not self.stopping.wait(delay):
+            delay = self.interval * random.uniform(0.9, 1.1)
+            try:
+                archived, pruned = self.sweep()
+                if archived or pruned:
+                    print(f"Archived {archived} expired access grants, deleted {pruned} old archived sessions")
+            except sqlite3.Error as e:
+                print(f"Access sweeper error: {e}")
@@ -0,0 +1,53 @@
+"""
+ASGI Entry Point
+Serves stripe_server's Flask app under an ASGI server:
+
+    pip install uvicorn asgiref
+    uvicorn asgi:app --workers 2 --limit-concurrency 500 --host 0.0.0.0 --port 8000
+
+The event loop holds every open connection (hundreds during a launch cost
+a few KB each), and each request's blocking work (Stripe calls, file reads)
+runs on a thread of its own, which spends almost all its time waiting on
+the network. Routes, sessions and responses are exactly those of the WSGI
+app. --limit-concurrency caps the requests (and so threads) in flight per
+worker; beyond it uvicorn answers 503.
+
+With more than one worker, set FLASK_SECRET_KEY (or DOWNLOAD_SIGNING_KEY):
+otherwise each worker signs sessions and download links with its own key.
+
+The stripe library (7.x) has no async HTTP client, so Stripe I/O is
+offloaded to threads rather than run on the loop itself. wsgi.py under
+gunicorn's threaded workers (gunicorn.conf.py) is the alternative when
+holding many idle connections does not matter.
+"""
+
+from asgiref.sync import ThreadSensitiveContext
+from asgiref.wsgi import WsgiToAsgi
+
+from stripe_server import create_app
+
+flask_app = create_app()
+wsgi_app = WsgiToAsgi(flask_app)
+
+
+async def app(scope, receive, send):
+    """ASGI application: lifespan events here, HTTP through the Flask app"""
+    if scope['type'] == 'lifespan':
+        await lifespan(receive, send)
+    else:
+        # WsgiToAsgi runs the app "thread-sensitively": on one shared thread,
+        # which would serialise all requests. A context per request gives each
+        # its own thread (Flask is thread-safe), ended when the request is
+        async with ThreadSensitiveContext():
+            await wsgi_app(scope, receive, send)
+
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            flask_app.extensions['stripe_server'].close()
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
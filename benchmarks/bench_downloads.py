@@ -0,0 +1,145 @@
+"""
+Protected PDF Download Benchmark
+Downloads every PDF in "The Confident Leader Toolkit" concurrently through
+/download/<file> with signed links: full downloads, resumed downloads
+(Range: bytes=<half>-), small ranges and conditional re-downloads (304).
+
+By default the Flask app runs in-process on a threaded development server.
+Point --url at a running server (e.g. gunicorn, which uses sendfile) to
+measure that instead; it must use the same DOWNLOAD_SIGNING_KEY (or
+FLASK_SECRET_KEY) as this process and serve the same PDFs.
+
+Run from the website root:
+    python benchmarks/bench_downloads.py [--concurrency 16] [--rounds 5] [--url http://127.0.0.1:8000]
+"""
+
+import os
+import sys
+import glob
+import time
+import argparse
+import threading
+import http.client
+from urllib.parse import quote, urlsplit
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+TOOLKIT_DIR = os.path.join(ROOT, 'The Confident Leader Toolkit')
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))] if values else 0.0
+
+
+class Client:
+    """One keep-alive connection per benchmark thread"""
+
+    def __init__(self, base_url):
+        self.parts = urlsplit(base_url)
+        self.local = threading.local()
+
+    def get(self, path, headers=None):
+        conn = getattr(self.local, 'conn', None)
+        if conn is None:
+            conn = self.local.conn = http.client.HTTPConnection(self.parts.hostname, self.parts.port, timeout=60)
+        started = time.perf_counter()
+        try:
+            conn.request('GET', path, headers=headers or {})
+            response = conn.getresponse()
+            body = response.read()
+        except (http.client.HTTPException, OSError):
+            self.local.conn = None
+            raise
+        return response.status, response.getheader('ETag'), len(body), time.perf_counter() - started
+
+
+def start_local_server():
+    os.environ.setdefault('ACCESS_STORE', 'memory')
+    import stripe_server
+    from werkzeug.serving import make_server, WSGIRequestHandler
+
+    class QuietHandler(WSGIRequestHandler):
+        def log_request(self, *args, **kwargs):
+            pass
+
+    app = stripe_server.create_app(PDF_FOLDER=TOOLKIT_DIR)
+    server = make_server('127.0.0.1', 0, app, threaded=True, request_handler=QuietHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f'http://127.0.0.1:{server.server_port}', signer(app)
+
+
+def signer(app):
+    """download_signature() bound to the app's signing key"""
+    import stripe_server
+
+    def sign(filename, expires):
+        with app.app_context():
+            return stripe_server.download_signature(filename, expires)
+    return sign
+
+
+def run(label, client, jobs, concurrency):
+    """jobs: [(path, headers, expected status)]"""
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(lambda job: client.get(job[0], job[1]) + (job[2],), jobs))
+    elapsed = time.perf_counter() - started
+
+    latencies = [r[3] for r in results]
+    total_bytes = sum(r[2] for r in results)
+    unexpected = sum(1 for r in results if r[0] != r[4])
+    print(f"{label:<18} {len(results):>6} {elapsed:>8.2f}s {len(results) / elapsed:>9.1f} "
+          f"{total_bytes / elapsed / 1e6:>9.1f} {percentile(latencies, 50) * 1000:>8.1f} "
+          f"{percentile(latencies, 95) * 1000:>8.1f} {unexpected:>6}")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--url', help="base URL of a running server (default: start one in-process)")
+    parser.add_argument('--concurrency', type=int, default=16, help="simultaneous downloads")
+    parser.add_argument('--rounds', type=int, default=5, help="downloads of each PDF per pass")
+    args = parser.parse_args()
+
+    pdfs = sorted(os.path.basename(p) for p in glob.glob(os.path.join(TOOLKIT_DIR, '*.pdf')))
+    if not pdfs:
+        sys.exit(f"No PDFs found in {TOOLKIT_DIR}")
+    sizes = {name: os.path.getsize(os.path.join(TOOLKIT_DIR, name)) for name in pdfs}
+
+    if args.url:
+        os.environ.setdefault('ACCESS_STORE', 'memory')
+        import stripe_server
+        base_url, sign = args.url.rstrip('/'), signer(stripe_server.create_app())
+    else:
+        base_url, sign = start_local_server()
+    client = Client(base_url)
+
+    expires = int(time.time()) + 3600
+    links = {name: f'/download/{quote(name)}?expires={expires}&sig={sign(name, expires)}' for name in pdfs}
+
+    print("=" * 86)
+    print(f"PDF DOWNLOAD BENCHMARK — {len(pdfs)} PDFs, {sum(sizes.values()) / 1e6:.1f} MB, "
+          f"concurrency {args.concurrency}, {base_url}")
+    print("=" * 86)
+    print(f"{'pass':<18} {'reqs':>6} {'time':>9} {'req/s':>9} {'MB/s':>9} {'p50 ms':>8} {'p95 ms':>8} {'errors':>6}")
+
+    run('full download', client,
+        [(links[name], {}, 200) for _ in range(args.rounds) for name in pdfs], args.concurrency)
+    run('resume (2nd half)', client,
+        [(links[name], {'Range': f'bytes={sizes[name] // 2}-'}, 206) for _ in range(args.rounds) for name in pdfs],
+        args.concurrency)
+    run('multi-range', client,
+        [(links[name], {'Range': 'bytes=0-1023,-1024'}, 206) for _ in range(args.rounds) for name in pdfs],
+        args.concurrency)
+
+    etags = {name: client.get(links[name], {'Range': 'bytes=0-0'})[1] for name in pdfs}
+    run('conditional (304)', client,
+        [(links[name], {'If-None-Match': etags[name]}, 304) for _ in range(args.rounds) for name in pdfs],
+        args.concurrency)
+
+
+if __name__ == '__main__':
+    main()
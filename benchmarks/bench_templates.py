@@ -0,0 +1,125 @@
+"""
+Template Rendering Micro-Benchmark
+Compares the old chained str.replace() rendering of blog_post_template.html
+with the precompiled templates in build_blog.py (render_template alone),
+then times the <img> to <picture> rewriting of post bodies on its own.
+
+Run from the website root:
+    python benchmarks/bench_templates.py [--number 2000]
+"""
+
+import os
+import sys
+import timeit
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import build_blog
+
+
+def replace_render(template, post):
+    """The rendering build_blog used before templates were compiled"""
+    output_html = template
+    output_html = output_html.replace('{{title}}', post['metadata'].get('title', 'Untitled'))
+    output_html = output_html.replace('{{date}}', str(post['metadata'].get('date', '')))
+    output_html = output_html.replace('{{category}}', post['metadata'].get('category', 'General'))
+    output_html = output_html.replace('{{description}}', post['metadata'].get('description', ''))
+    output_html = output_html.replace('{{content}}', post['content'])
+    return output_html
+
+
+def template_values(compiled, post, assets):
+    """The slots render_post fills, with the body as it is (no image rewriting)"""
+    return {
+        **assets.slots(compiled, '../'),
+        'title': post['metadata'].get('title', 'Untitled'),
+        'date': post['metadata'].get('date', ''),
+        'category': post['metadata'].get('category', 'General'),
+        'description': post['metadata'].get('description', ''),
+        'content': build_blog.Markup(post['content']),
+    }
+
+
+class NoImages:
+    """Image pipeline stand-in: enabled, but no variants, so every <img> is
+    looked at and kept"""
+
+    enabled = True
+
+    def picture(self, path):
+        return None
+
+
+class PlainAssets:
+    """Assets stand-in: original asset URLs, nothing hashed or copied"""
+
+    def slots(self, compiled, root):
+        return {name: build_blog.Markup(root + name[len('asset:'):])
+                for name in compiled[1::2] if name.startswith('asset:')}
+
+
+def sample_post(paragraphs, images=False):
+    image = '<p><img src="../images/sample.jpg" alt="Sample"></p>\n' if images else ''
+    body = ''.join(
+        f"<h2>Section {i}</h2>\n{image}<p>{'Leaders build systems that scale. ' * 30}</p>\n"
+        for i in range(paragraphs)
+    )
+    return {
+        'metadata': {
+            'title': 'Welcome to the New Systems Blog',
+            'date': '2026-01-06',
+            'category': 'Leadership',
+            # Frontmatter that mentions a placeholder must come out verbatim
+            'description': 'How our {{content}} placeholders work.',
+        },
+        'content': body,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--number', type=int, default=2000, help="renders per measurement")
+    args = parser.parse_args()
+
+    os.chdir(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    template_text = build_blog.load_template('blog_post_template.html')
+    compiled = build_blog.compile_template(template_text)
+    pipeline, assets = NoImages(), PlainAssets()
+
+    print("=" * 70)
+    print("TEMPLATE RENDERING BENCHMARK")
+    print("=" * 70)
+    for paragraphs in (5, 50, 500):
+        post = sample_post(paragraphs)
+        size_kb = len(build_blog.render_template(compiled, template_values(compiled, post, assets))) / 1024
+
+        old = min(timeit.repeat(lambda: replace_render(template_text, post), number=args.number, repeat=5))
+        new = min(timeit.repeat(lambda: build_blog.render_template(compiled, template_values(compiled, post, assets)),
+                                number=args.number, repeat=5))
+        compile_cost = min(timeit.repeat(lambda: build_blog.compile_template(template_text), number=args.number, repeat=5))
+
+        print(f"{size_kb:8.1f} KB page | str.replace: {old / args.number * 1e6:8.1f} µs"
+              f" | compiled: {new / args.number * 1e6:8.1f} µs"
+              f" | speedup: {old / new:5.2f}x")
+    print(f"compile (once per template): {compile_cost / args.number * 1e6:.1f} µs")
+
+    print()
+    print("IMAGE REWRITING (render_post_images, per post body)")
+    for paragraphs in (5, 50, 500):
+        plain, illustrated = sample_post(paragraphs)['content'], sample_post(paragraphs, images=True)['content']
+        no_img = min(timeit.repeat(lambda: build_blog.render_post_images(plain, pipeline), number=args.number, repeat=5))
+        with_img = min(timeit.repeat(lambda: build_blog.render_post_images(illustrated, pipeline),
+                                     number=args.number, repeat=5))
+        print(f"{len(plain) / 1024:8.1f} KB body | no <img>: {no_img / args.number * 1e6:8.1f} µs"
+              f" | {paragraphs} <img>: {with_img / args.number * 1e6:8.1f} µs")
+
+    post = sample_post(1)
+    print()
+    print("Placeholder text in frontmatter left intact:")
+    print(f"   str.replace: {'{{content}}' in replace_render(template_text, post)}")
+    print(f"   compiled:    {'{{content}}' in build_blog.render_template(compiled, template_values(compiled, post, assets))}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,185 @@
+"""
+Blog Build Benchmark
+Times build_blog() phase by phase on synthetic corpora, so a change that
+makes the build scale worse shows up long before the real archive is big.
+
+For each corpus size a throwaway site (the real templates and assets plus
+generated _posts) is built three ways:
+  cold      first build, everything rendered
+  no-op     nothing changed (the incremental path)
+  edit      one post changed
+
+    python build_blog.py --bench                       10, 1,000 and 10,000 posts
+    python build_blog.py --bench --bench-sizes 100,5000 --jobs 4
+    python build_blog.py --bench --profile build.pstats --tracemalloc
+
+--profile and --tracemalloc work on an ordinary build too.
+"""
+
+import io
+import os
+import sys
+import time
+import random
+import shutil
+import pstats
+import tempfile
+import cProfile
+import tracemalloc
+import contextlib
+from datetime import date, timedelta
+
+import build_blog
+
+DEFAULT_SIZES = (10, 1000, 10000)
+SITE_FILES = ('style.css', 'js/blog-search.js', 'ChristopherLynnHeadshot_v2.jpg')
+SCENARIOS = ('cold', 'no-op', 'edit')
+
+CATEGORIES = ('Leadership', 'Burnout', 'Systems', 'Coaching', 'Productivity', 'Culture')
+TAGS = ('delegation', 'focus', 'habits', 'teams', 'strategy', 'recovery', 'hiring', 'meetings', 'clarity', 'growth')
+WORDS = '''
+leader team system burnout clarity decision process energy trust meeting
+calendar delegate priority outcome founder growth feedback habit focus
+recovery boundary scale operator weekly review metric owner handoff rhythm
+strategy hiring culture friction signal noise margin capacity leverage
+'''.split()
+
+
+def sentence(rng, words=12):
+    text = ' '.join(rng.choice(WORDS) for _ in range(rng.randint(words // 2, words * 2)))
+    return text.capitalize() + '.'
+
+
+def synthetic_post(number, rng):
+    """Markdown with frontmatter, shaped like the real posts (headings,
+    paragraphs, lists, links, emphasis, the odd code block)"""
+    published = date(2020, 1, 1) + timedelta(days=number % 2000)
+    tags = ', '.join(rng.sample(TAGS, rng.randint(1, 3)))
+    lines = [
+        '---',
+        f'title: "{sentence(rng, 4)[:-1]} {number}"',
+        f'date: {published.isoformat()}',
+        f'category: {rng.choice(CATEGORIES)}',
+        f'tags: [{tags}]',
+        f'description: "{sentence(rng, 10)}"',
+        '---',
+        '',
+    ]
+    for section in range(rng.randint(3, 6)):
+        lines += [f'## {sentence(rng, 3)[:-1]}', '']
+        for _ in range(rng.randint(2, 4)):
+            lines += [' '.join(sentence(rng) for _ in range(rng.randint(2, 5))), '']
+        if section % 2:
+            lines += [f'- **{rng.choice(WORDS)}**: {sentence(rng, 6)}' for _ in range(rng.randint(3, 6))] + ['']
+        if section == 2:
+            lines += ['```', f'{rng.choice(WORDS)} = "{rng.choice(WORDS)}"', '```', '']
+    lines += [f'Read more about [{rng.choice(WORDS)}](https://example.com/{number}).', '']
+    return '\n'.join(lines)
+
+
+def make_site(directory, count, seed=1):
+    """A site tree with the real templates and assets and `count` generated posts"""
+    shutil.copytree(build_blog.TEMPLATES_DIR, os.path.join(directory, build_blog.TEMPLATES_DIR))
+    for path in SITE_FILES:
+        if os.path.exists(path):
+            os.makedirs(os.path.join(directory, os.path.dirname(path)), exist_ok=True)
+            shutil.copy2(path, os.path.join(directory, path))
+
+    rng = random.Random(seed)
+    posts_dir = os.path.join(directory, build_blog.POSTS_DIR)
+    os.makedirs(posts_dir)
+    for number in range(count):
+        with open(os.path.join(posts_dir, f'post-{number:05d}.md'), 'w', encoding='utf-8') as f:
+            f.write(synthetic_post(number, rng))
+
+
+@contextlib.contextmanager
+def working_directory(path):
+    previous = os.getcwd()
+    os.chdir(path)
+    try:
+        yield
+    finally:
+        os.chdir(previous)
+
+
+@contextlib.contextmanager
+def profiled(path):
+    """cProfile the block; write the stats to `path` and print the top functions"""
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        profiler.dump_stats(path)
+        print(f"\n📈 Profile written to {path} (top 25 by cumulative time):")
+        pstats.Stats(profiler, stream=sys.stdout).sort_stats('cumulative').print_stats(25)
+
+
+@contextlib.contextmanager
+def traced_memory(top=10):
+    """tracemalloc the block; print the peak and the biggest allocation sites"""
+    tracemalloc.start()
+    try:
+        yield
+    finally:
+        snapshot = tracemalloc.take_snapshot()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        print(f"\n🧠 Peak traced memory: {peak / 1e6:.1f} MB. Largest live allocations:")
+        for stat in snapshot.statistics('lineno')[:top]:
+            print(f"   {stat.size / 1e3:>9.1f} KB  {stat.count:>7} blocks  {stat.traceback}")
+
+
+def timed_build(jobs, minify, force=False):
+    """One quiet build; (phase seconds, total seconds, peak traced MB or None)"""
+    timer = build_blog.BuildTimer()
+    if tracemalloc.is_tracing():
+        tracemalloc.reset_peak()
+    started = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        errors = build_blog.build_blog(force=force, jobs=jobs, minify=minify, timer=timer)
+    total = time.perf_counter() - started
+    if errors:
+        raise RuntimeError(f"{len(errors)} synthetic post(s) failed: {errors[0]}")
+    peak = tracemalloc.get_traced_memory()[1] / 1e6 if tracemalloc.is_tracing() else None
+    return timer.seconds, total, peak
+
+
+def bench_size(count, jobs=1, minify=False, seed=1):
+    """{scenario: (phase seconds, total, peak MB)} for a fresh corpus of `count` posts"""
+    with tempfile.TemporaryDirectory(prefix='blog-bench-') as directory:
+        make_site(directory, count, seed)
+        with working_directory(directory):
+            results = {'cold': timed_build(jobs, minify, force=True)}
+            results['no-op'] = timed_build(jobs, minify)
+            edited = os.path.join(build_blog.POSTS_DIR, f'post-{count // 2:05d}.md')
+            with open(edited, 'a', encoding='utf-8') as f:
+                f.write('\nOne more paragraph, added by the benchmark.\n')
+            results['edit'] = timed_build(jobs, minify)
+    return results
+
+
+def print_report(count, results):
+    phases = []
+    for seconds, _, _ in results.values():
+        phases += [name for name in seconds if name not in phases]
+
+    print(f"\n📊 {count:,} posts")
+    print(f"   {'phase':<28}" + ''.join(f'{s:>11}' for s in SCENARIOS))
+    for name in phases:
+        label = '  ' + name.split(': ', 1)[1] if ': ' in name else name
+        print(f"   {label:<28}" + ''.join(f"{results[s][0].get(name, 0.0):>10.3f}s" for s in SCENARIOS))
+    print(f"   {'total':<28}" + ''.join(f"{results[s][1]:>10.3f}s" for s in SCENARIOS))
+    cold = results['cold'][1]
+    print(f"   {'posts/s (cold)':<28}{count / cold:>10.0f}")
+    if results['cold'][2] is not None:
+        print(f"   {'peak traced memory':<28}" + ''.join(f"{results[s][2]:>9.1f}MB" for s in SCENARIOS))
+
+
+def bench(sizes=DEFAULT_SIZES, jobs=1, minify=False):
+    print(f"⏱️  Benchmarking build_blog() on {', '.join(f'{n:,}' for n in sizes)} synthetic posts "
+          f"(jobs={jobs}{', minify' if minify else ''})")
+    for count in sizes:
+        print_report(count, bench_size(count, jobs, minify))
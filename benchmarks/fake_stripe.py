@@ -0,0 +1,180 @@
+"""
+Fake Stripe API
+A local stand-in for the parts of the Stripe API stripe_server.py uses, for
+benchmarks and offline testing. Point the server at it with STRIPE_API_BASE.
+
+- POST /v1/checkout/sessions         creates a session (already paid); the
+                                     Idempotency-Key is honoured like Stripe's
+- GET  /v1/checkout/sessions/{id}    returns it
+- signed_webhook() builds a checkout.session.completed event and the
+  Stripe-Signature header for it, signed with STRIPE_WEBHOOK_SECRET
+
+Each response can be delayed (`latency` seconds, +/- 20%) to stand in for
+the real API's round trip.
+
+Run on its own:
+    python benchmarks/fake_stripe.py --port 12111 [--latency 0.05]
+    STRIPE_API_BASE=http://127.0.0.1:12111 python stripe_server.py
+"""
+
+import json
+import time
+import hmac
+import random
+import hashlib
+import argparse
+import itertools
+import threading
+from urllib.parse import parse_qs
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+SESSIONS_PATH = '/v1/checkout/sessions'
+
+
+def checkout_session(session_id, email):
+    return {
+        'id': session_id,
+        'object': 'checkout.session',
+        'created': int(time.time()),
+        'customer_email': email,
+        'metadata': {'customer_email': email},
+        'mode': 'payment',
+        'payment_status': 'paid',
+        'status': 'complete',
+        'amount_total': 9700,
+        'currency': 'usd',
+        'url': f'https://checkout.stripe.test/pay/{session_id}',
+    }
+
+
+def webhook_signature(payload, secret, timestamp=None):
+    """Stripe-Signature header value for `payload` (bytes)"""
+    timestamp = int(time.time()) if timestamp is None else timestamp
+    signed = f'{timestamp}.'.encode('utf-8') + payload
+    digest = hmac.new(secret.encode('utf-8'), signed, hashlib.sha256).hexdigest()
+    return f't={timestamp},v1={digest}'
+
+
+def signed_webhook(session, secret, event_id):
+    """(payload bytes, Stripe-Signature) for a checkout.session.completed event"""
+    event = {
+        'id': event_id,
+        'object': 'event',
+        'type': 'checkout.session.completed',
+        'created': int(time.time()),
+        'livemode': False,
+        'data': {'object': session},
+    }
+    payload = json.dumps(event).encode('utf-8')
+    return payload, webhook_signature(payload, secret)
+
+
+class FakeStripe:
+    """Threaded HTTP server answering like the Stripe API."""
+
+    def __init__(self, host='127.0.0.1', port=0, latency=0.0):
+        self.latency = latency
+        self.lock = threading.Lock()
+        self.sessions = {}
+        self.idempotent = {}  # Idempotency-Key -> session id
+        self.ids = itertools.count(1)
+        self.requests = {'create': 0, 'retrieve': 0}
+        self.server = _Server((host, port), _Handler)
+        self.server.fake = self
+        self.thread = None
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, name='fake-stripe', daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def create_session(self, email, idempotency_key=None):
+        with self.lock:
+            if idempotency_key in self.idempotent:
+                return self.sessions[self.idempotent[idempotency_key]]
+            session = checkout_session(f'cs_test_{next(self.ids):08d}', email)
+            self.sessions[session['id']] = session
+            if idempotency_key:
+                self.idempotent[idempotency_key] = session['id']
+        return session
+
+    def wait(self):
+        if self.latency:
+            time.sleep(self.latency * random.uniform(0.8, 1.2))
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 256
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        pass
+
+    def reply(self, status, body):
+        data = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.send_header('Request-Id', f'req_fake_{random.getrandbits(48):012x}')
+        self.end_headers()
+        self.wfile.write(data)
+
+    def not_found(self):
+        self.reply(404, {'error': {'type': 'invalid_request_error', 'message': f'No such resource: {self.path}'}})
+
+    def do_POST(self):
+        fake = self.server.fake
+        length = int(self.headers.get('Content-Length') or 0)
+        form = parse_qs(self.rfile.read(length).decode('utf-8'))
+        if self.path.split('?')[0] != SESSIONS_PATH:
+            return self.not_found()
+        fake.wait()
+        email = (form.get('customer_email') or [None])[0]
+        session = fake.create_session(email, self.headers.get('Idempotency-Key'))
+        with fake.lock:
+            fake.requests['create'] += 1
+        self.reply(200, session)
+
+    def do_GET(self):
+        fake = self.server.fake
+        path = self.path.split('?')[0]
+        if not path.startswith(SESSIONS_PATH + '/'):
+            return self.not_found()
+        fake.wait()
+        session = fake.sessions.get(path[len(SESSIONS_PATH) + 1:])
+        if session is None:
+            return self.not_found()
+        with fake.lock:
+            fake.requests['retrieve'] += 1
+        self.reply(200, session)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--port', type=int, default=12111)
+    parser.add_argument('--latency', type=float, default=0.0, help="seconds added to every response")
+    args = parser.parse_args()
+
+    fake = FakeStripe(port=args.port, latency=args.latency)
+    print(f"Fake Stripe API on {fake.url} (latency {args.latency * 1000:.0f} ms)")
+    try:
+        fake.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,363 @@
+"""
+stripe_server Load Test
+Starts the app against a local fake Stripe API (benchmarks/fake_stripe.py)
+and drives traffic profiles through it at each concurrency level:
+
+  checkout   POST /create-checkout-session (one Stripe create per request)
+  success    GET  /success for a paid session not seen before (one Stripe retrieve)
+  download   GET  /download/<pdf> through a signed link
+  webhook    POST /webhook with a checkout.session.completed event signed
+             with STRIPE_WEBHOOK_SECRET
+  mixed      all four, weighted like a launch day
+
+For each run it reports throughput, p50/p95/p99 latency per route and the
+server's resident memory (start, peak, end; workers included). --json
+saves the results with the commit they were measured on; --compare prints
+the change against an earlier file.
+
+The server runs as a subprocess with its own temporary databases:
+--server dev (Flask's threaded server), gunicorn (gunicorn.conf.py) or waitress.
+
+Run from the website root:
+    python benchmarks/load_test.py [--profile mixed] [--concurrency 8,32] [--requests 2000]
+        [--server gunicorn --workers 4 --threads 8] [--stripe-latency 0.05]
+        [--json results/load-$(git rev-parse --short HEAD).json] [--compare results/load-abc1234.json]
+"""
+
+import os
+import sys
+import json
+import glob
+import time
+import random
+import socket
+import argparse
+import platform
+import tempfile
+import threading
+import subprocess
+import http.client
+from datetime import datetime
+from urllib.parse import quote
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from fake_stripe import FakeStripe, signed_webhook
+from bench_downloads import percentile, signer
+
+PROFILES = {
+    'checkout': {'checkout': 1},
+    'success': {'success': 1},
+    'download': {'download': 1},
+    'webhook': {'webhook': 1},
+    'mixed': {'checkout': 3, 'success': 2, 'download': 4, 'webhook': 1},
+}
+WEBHOOK_SECRET = 'whsec_load_test'
+SECRET_KEY = 'load-test-secret'
+
+
+class Client:
+    """One keep-alive connection per load thread"""
+
+    def __init__(self, port):
+        self.port = port
+        self.local = threading.local()
+
+    def request(self, method, path, body=None, headers=None):
+        conn = getattr(self.local, 'conn', None)
+        if conn is None:
+            conn = self.local.conn = http.client.HTTPConnection('127.0.0.1', self.port, timeout=60)
+        started = time.perf_counter()
+        try:
+            conn.request(method, path, body=body, headers=headers or {})
+            response = conn.getresponse()
+            response.read()
+            status = response.status
+        except (http.client.HTTPException, OSError):
+            conn.close()
+            self.local.conn = None
+            status = 0
+        return status, time.perf_counter() - started
+
+
+class Traffic:
+    """Builds requests of each kind; every one uses a fresh email / session / event"""
+
+    def __init__(self, fake, sign, pdfs):
+        self.fake = fake
+        self.sign = sign
+        self.pdfs = pdfs
+        self.serial = 0
+
+    def next_email(self):
+        self.serial += 1
+        return f'load-{os.getpid()}-{self.serial}@bench.test'
+
+    def build(self, kind, rng):
+        """(method, path, body, headers)"""
+        if kind == 'checkout':
+            body = json.dumps({'email': self.next_email()})
+            return 'POST', '/create-checkout-session', body, {'Content-Type': 'application/json'}
+        if kind == 'success':
+            session = self.fake.create_session(self.next_email())
+            return 'GET', f"/success?session_id={session['id']}", None, {}
+        if kind == 'download':
+            name = rng.choice(self.pdfs)
+            expires = int(time.time()) + 3600
+            return 'GET', f'/download/{quote(name)}?expires={expires}&sig={self.sign(name, expires)}', None, {}
+        if kind == 'webhook':
+            session = self.fake.create_session(self.next_email())
+            payload, signature = signed_webhook(session, WEBHOOK_SECRET, f'evt_load_{session["id"]}')
+            return 'POST', '/webhook', payload, {'Content-Type': 'application/json', 'Stripe-Signature': signature}
+        raise ValueError(kind)
+
+    def jobs(self, profile, count, rng):
+        kinds = list(PROFILES[profile])
+        weights = [PROFILES[profile][k] for k in kinds]
+        return [(kind,) + self.build(kind, rng) for kind in rng.choices(kinds, weights, k=count)]
+
+
+def process_rss(pid):
+    """Resident memory in bytes of `pid` and its child processes (Linux; else None)"""
+    try:
+        pids = [pid] + [int(p) for p in os.listdir('/proc') if p.isdigit() and parent_pid(p) == pid]
+        page = os.sysconf('SC_PAGE_SIZE')
+        total = 0
+        for p in pids:
+            with open(f'/proc/{p}/statm') as f:
+                total += int(f.read().split()[1]) * page
+        return total
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def parent_pid(pid):
+    try:
+        with open(f'/proc/{pid}/stat') as f:
+            return int(f.read().rsplit(')', 1)[1].split()[1])
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+class MemorySampler:
+    """Samples the server's RSS every 100 ms during a run"""
+
+    def __init__(self, pid):
+        self.pid = pid
+        self.samples = []
+        self.done = threading.Event()
+        self.thread = threading.Thread(target=self._sample, daemon=True)
+
+    def _sample(self):
+        while True:
+            rss = process_rss(self.pid)
+            if rss is not None:
+                self.samples.append(rss)
+            if self.done.wait(0.1):
+                break
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.done.set()
+        self.thread.join()
+
+    def summary(self):
+        if not self.samples:
+            return None
+        mb = lambda b: round(b / 1e6, 1)
+        return {'start_mb': mb(self.samples[0]), 'peak_mb': mb(max(self.samples)), 'end_mb': mb(self.samples[-1])}
+
+
+def run(client, jobs, concurrency, server_pid):
+    """Send every job; per-route and overall results"""
+    with MemorySampler(server_pid) as memory:
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            results = list(pool.map(lambda job: (job[0],) + client.request(*job[1:]), jobs))
+        elapsed = time.perf_counter() - started
+
+    routes = {}
+    for kind in sorted({r[0] for r in results}):
+        latencies = [r[2] for r in results if r[0] == kind]
+        routes[kind] = {
+            'count': len(latencies),
+            'errors': sum(1 for r in results if r[0] == kind and r[1] != 200),
+            'throughput': round(len(latencies) / elapsed, 1),
+            'p50_ms': round(percentile(latencies, 50) * 1000, 2),
+            'p95_ms': round(percentile(latencies, 95) * 1000, 2),
+            'p99_ms': round(percentile(latencies, 99) * 1000, 2),
+            'max_ms': round(max(latencies) * 1000, 2),
+        }
+    return {
+        'requests': len(results),
+        'seconds': round(elapsed, 3),
+        'throughput': round(len(results) / elapsed, 1),
+        'errors': sum(route['errors'] for route in routes.values()),
+        'memory': memory.summary(),
+        'routes': routes,
+    }
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def start_server(args, env, port, log):
+    if args.server == 'gunicorn':
+        cmd = [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', 'wsgi:app']
+        env.update(BIND=f'127.0.0.1:{port}', WEB_CONCURRENCY=str(args.workers), WEB_THREADS=str(args.threads))
+    elif args.server == 'waitress':
+        cmd = [sys.executable, 'wsgi.py']
+        env.update(PORT=str(port), WEB_THREADS=str(args.threads))
+    else:
+        cmd = [sys.executable, '-c', f"import wsgi; wsgi.app.run(host='127.0.0.1', port={port}, threaded=True)"]
+    process = subprocess.Popen(cmd, cwd=ROOT, env=env, stdout=log, stderr=subprocess.STDOUT)
+
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        if process.poll() is not None:
+            sys.exit(f"Server exited with {process.returncode}; see {log.name}")
+        try:
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=2)
+            conn.request('GET', '/cancel')
+            if conn.getresponse().status == 200:
+                return process
+        except OSError:
+            time.sleep(0.2)
+    process.terminate()
+    sys.exit(f"Server did not start within 30s; see {log.name}")
+
+
+def git_commit():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=ROOT, capture_output=True, text=True).stdout.strip()
+        dirty = bool(subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'],
+                                    cwd=ROOT, capture_output=True, text=True).stdout.strip())
+        return commit or None, dirty
+    except OSError:
+        return None, None
+
+
+def print_run(profile, concurrency, result):
+    memory = result['memory']
+    memory_text = f"rss {memory['start_mb']}→{memory['end_mb']} MB (peak {memory['peak_mb']})" if memory else ''
+    print(f"\n{profile} @ {concurrency}: {result['requests']} requests in {result['seconds']:.2f}s, "
+          f"{result['throughput']:.1f} req/s, {result['errors']} errors  {memory_text}")
+    for route, r in result['routes'].items():
+        print(f"  {route:<10} {r['count']:>6} {r['throughput']:>9.1f} {r['p50_ms']:>8.1f} {r['p95_ms']:>8.1f} "
+              f"{r['p99_ms']:>8.1f} {r['max_ms']:>8.1f} {r['errors']:>6}")
+
+
+def compare(results, baseline_path):
+    with open(baseline_path, encoding='utf-8') as f:
+        baseline = json.load(f)
+    before = {(r['profile'], r['concurrency']): r for r in baseline['runs']}
+    print(f"\nCompared with {baseline_path} ({(baseline['meta'].get('commit') or '?')[:10]}):")
+    print(f"  {'run':<22} {'route':<10} {'req/s':>16} {'p95 ms':>18}")
+    for run_result in results['runs']:
+        old = before.get((run_result['profile'], run_result['concurrency']))
+        if old is None:
+            continue
+        for route, r in run_result['routes'].items():
+            o = old['routes'].get(route)
+            if o is None:
+                continue
+            change = lambda new, was: f"{(new - was) / was * 100:+.0f}%" if was else 'n/a'
+            print(f"  {run_result['profile'] + ' @ ' + str(run_result['concurrency']):<22} {route:<10} "
+                  f"{r['throughput']:>8.1f} {change(r['throughput'], o['throughput']):>7} "
+                  f"{r['p95_ms']:>9.1f} {change(r['p95_ms'], o['p95_ms']):>8}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--profile', action='append', choices=sorted(PROFILES),
+                        help="traffic profile (repeatable; default: every profile)")
+    parser.add_argument('--concurrency', default='8,32', help="comma-separated client concurrency levels")
+    parser.add_argument('--requests', type=int, default=1000, help="requests per run")
+    parser.add_argument('--warmup', type=int, default=50, help="unmeasured requests before each profile")
+    parser.add_argument('--server', choices=('dev', 'gunicorn', 'waitress'), default='dev')
+    parser.add_argument('--workers', type=int, default=2, help="gunicorn worker processes")
+    parser.add_argument('--threads', type=int, default=8, help="threads per gunicorn worker / waitress")
+    parser.add_argument('--stripe-latency', type=float, default=0.05, help="seconds the fake Stripe API takes")
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--json', help="write the results here")
+    parser.add_argument('--compare', help="earlier --json results to compare against")
+    args = parser.parse_args()
+    profiles = args.profile or list(PROFILES)
+    levels = [int(c) for c in args.concurrency.split(',')]
+
+    pdf_dir = os.path.join(ROOT, 'Resources', 'protected_pdfs')
+    if not glob.glob(os.path.join(pdf_dir, '*.pdf')):
+        pdf_dir = os.path.join(ROOT, 'The Confident Leader Toolkit')
+    pdfs = sorted(os.path.basename(p) for p in glob.glob(os.path.join(pdf_dir, '*.pdf')))
+    if not pdfs:
+        sys.exit("No PDFs to download")
+
+    fake = FakeStripe(latency=args.stripe_latency).start()
+    scratch = tempfile.mkdtemp(prefix='load-test-')
+    env = dict(os.environ,
+               STRIPE_API_BASE=fake.url, STRIPE_SECRET_KEY='sk_test_load', STRIPE_PUBLISHABLE_KEY='pk_test_load',
+               STRIPE_PRICE_ID='price_load', STRIPE_WEBHOOK_SECRET=WEBHOOK_SECRET,
+               FLASK_SECRET_KEY=SECRET_KEY, DOWNLOAD_SIGNING_KEY=SECRET_KEY, PDF_FOLDER=pdf_dir,
+               ACCESS_STORE='sqlite', ACCESS_DB_PATH=os.path.join(scratch, 'access.db'),
+               WEBHOOK_QUEUE_PATH=os.path.join(scratch, 'webhooks.db'), METRICS_DIR=os.path.join(scratch, 'metrics'),
+               RATE_LIMIT_STORE='off')  # Every simulated client shares 127.0.0.1
+    os.environ.update(env)
+
+    import stripe_server
+    traffic = Traffic(fake, signer(stripe_server.create_app()), pdfs)
+
+    port = free_port()
+    with open(os.path.join(scratch, 'server.log'), 'w') as log:
+        server = start_server(args, env, port, log)
+        client = Client(port)
+        commit, dirty = git_commit()
+        results = {
+            'meta': {
+                'commit': commit, 'dirty': dirty, 'date': datetime.now().isoformat(timespec='seconds'),
+                'python': platform.python_version(), 'platform': platform.platform(),
+                'server': args.server, 'workers': args.workers, 'threads': args.threads,
+                'stripe_latency': args.stripe_latency, 'requests': args.requests, 'seed': args.seed,
+            },
+            'runs': [],
+        }
+        print("=" * 86)
+        print(f"LOAD TEST — {args.server} server, fake Stripe at {args.stripe_latency * 1000:.0f} ms, "
+              f"{args.requests} requests per run")
+        print("=" * 86)
+        print(f"  {'route':<10} {'reqs':>6} {'req/s':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} "
+              f"{'max ms':>8} {'errors':>6}")
+        try:
+            rng = random.Random(args.seed)
+            for profile in profiles:
+                if args.warmup:
+                    run(client, traffic.jobs(profile, args.warmup, rng), min(levels), server.pid)
+                for concurrency in levels:
+                    result = run(client, traffic.jobs(profile, args.requests, rng), concurrency, server.pid)
+                    result.update(profile=profile, concurrency=concurrency)
+                    results['runs'].append(result)
+                    print_run(profile, concurrency, result)
+        finally:
+            server.terminate()
+            server.wait(30)
+            fake.stop()
+    results['meta']['stripe_calls'] = dict(fake.requests)
+
+    if args.json:
+        os.makedirs(os.path.dirname(os.path.abspath(args.json)), exist_ok=True)
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+        print(f"\nSaved {args.json}")
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == '__main__':
+    main()
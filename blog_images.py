@@ -0,0 +1,190 @@
+"""
+Responsive Images for the Blog Build
+For every image a post references, build_blog.py asks this module for resized
+copies in AVIF / WebP plus the original format (written to images/responsive/)
+and emits <picture>/srcset markup for them.
+
+Variants are cached by the source file's content hash, so an unchanged image
+is never re-encoded. Pillow is optional: without it (or for remote / missing
+images) pages keep pointing at the original file.
+"""
+
+import os
+import json
+import html
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    from PIL import Image, ImageOps, features
+except ImportError:
+    Image = None
+
+RESPONSIVE_DIR = os.path.join('images', 'responsive')
+CACHE_PATH = os.path.join('.build_cache', 'images.json')
+CACHE_VERSION = 1
+
+IMAGE_WIDTHS = (480, 960, 1600)
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.webp')
+
+# (mime type, Pillow format, extension, save options), best format first
+MODERN_FORMATS = (
+    ('image/avif', 'AVIF', 'avif', {'quality': 55, 'speed': 6}),
+    ('image/webp', 'WEBP', 'webp', {'quality': 80, 'method': 6}),
+)
+JPEG_FORMAT = ('image/jpeg', 'JPEG', 'jpg', {'quality': 82, 'optimize': True, 'progressive': True})
+PNG_FORMAT = ('image/png', 'PNG', 'png', {'optimize': True})
+
+
+def available_formats():
+    if Image is None:
+        return ()
+    return tuple(fmt for fmt in MODERN_FORMATS if features.check(fmt[2]))
+
+
+def encode_variants(path, digest):
+    """Write every width/format of one image; returns its cache record.
+    Top-level so it can run on a process pool."""
+    with Image.open(path) as source:
+        img = ImageOps.exif_transpose(source)
+        has_alpha = img.mode in ('RGBA', 'LA') or (img.mode == 'P' and 'transparency' in img.info)
+        img = img.convert('RGBA' if has_alpha else 'RGB')
+
+    width, height = img.size
+    widths = sorted({w for w in IMAGE_WIDTHS if w < width} | {min(width, IMAGE_WIDTHS[-1])})
+    stem = os.path.splitext(os.path.basename(path))[0]
+    fallback = PNG_FORMAT if has_alpha else JPEG_FORMAT
+
+    os.makedirs(RESPONSIVE_DIR, exist_ok=True)
+    sources = []
+    for mime, pil_format, ext, options in available_formats() + (fallback,):
+        variants = []
+        for w in widths:
+            out_path = os.path.join(RESPONSIVE_DIR, f'{stem}-{digest[:10]}-{w}.{ext}')
+            if not os.path.exists(out_path):
+                resized = img if w == width else img.resize((w, round(height * w / width)), Image.LANCZOS)
+                resized.save(out_path + '.tmp', pil_format, **options)
+                os.replace(out_path + '.tmp', out_path)
+            variants.append([out_path.replace(os.sep, '/'), w])
+        sources.append([mime, variants])
+
+    return {
+        'width': widths[-1],
+        'height': round(height * widths[-1] / width),
+        'sources': sources,
+    }
+
+
+def picture_html(info, root, alt='', sizes='100vw', css_class=None, eager=False):
+    """<picture> markup for a record from ImagePipeline.picture()."""
+    def srcset(variants):
+        return html.escape(', '.join(f'{root}{path} {w}w' for path, w in variants))
+
+    class_attr = f' class="{css_class}"' if css_class else ''
+    loading = 'loading="eager" fetchpriority="high"' if eager else 'loading="lazy"'
+    *modern, (fallback_mime, fallback) = info['sources']
+
+    tags = [f'<picture{class_attr}>']
+    for mime, variants in modern:
+        tags.append(f'<source type="{mime}" srcset="{srcset(variants)}" sizes="{sizes}">')
+    tags.append(
+        f'<img src="{html.escape(root + fallback[-1][0])}" srcset="{srcset(fallback)}" sizes="{sizes}"'
+        f' width="{info["width"]}" height="{info["height"]}" alt="{html.escape(alt)}" {loading} decoding="async">'
+    )
+    tags.append('</picture>')
+    return ''.join(tags)
+
+
+class ImagePipeline:
+    """Tracks source hashes and encoded variants across builds. `hash_file`
+    is the build's content hash (build_blog.file_hash)."""
+
+    def __init__(self, hash_file):
+        self.hash_file = hash_file
+        self.enabled = Image is not None
+        self.cache = self._load()
+        self.used = set()
+
+    def _load(self):
+        try:
+            with open(CACHE_PATH, 'r', encoding='utf-8') as f:
+                cache = json.load(f)
+            if cache.get('version') == CACHE_VERSION:
+                return cache
+        except (FileNotFoundError, ValueError):
+            pass
+        return {'version': CACHE_VERSION, 'sources': {}, 'images': {}}
+
+    def source_hash(self, path):
+        # Content hash of a local image, re-read only when its mtime/size change
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        known = self.cache['sources'].get(path)
+        if not known or known['mtime_ns'] != st.st_mtime_ns or known['size'] != st.st_size:
+            known = {'mtime_ns': st.st_mtime_ns, 'size': st.st_size, 'hash': self.hash_file(path)}
+            self.cache['sources'][path] = known
+        self.used.add(path)
+        return known['hash']
+
+    def prepare(self, paths, jobs=1):
+        """Encode variants for any of `paths` not already in the cache."""
+        if not self.enabled:
+            return 0
+
+        pending = {}
+        for path in sorted(set(paths)):
+            if not path.lower().endswith(IMAGE_EXTENSIONS):
+                continue
+            digest = self.source_hash(path)
+            if digest and not self._complete(self.cache['images'].get(digest)):
+                pending.setdefault(digest, path)
+
+        if not pending:
+            return 0
+        items = sorted(pending.items(), key=lambda item: item[1])
+        args = ([path for _, path in items], [digest for digest, _ in items])
+        if jobs > 1 and len(items) > 1:
+            with ProcessPoolExecutor(max_workers=min(jobs, len(items))) as pool:
+                records = list(pool.map(encode_variants, *args))
+        else:
+            records = list(map(encode_variants, *args))
+
+        for (digest, path), record in zip(items, records):
+            self.cache['images'][digest] = record
+            print(f"🖼️  Encoded: {path}")
+        return len(items)
+
+    def _complete(self, record):
+        return bool(record) and all(
+            os.path.exists(path) for _, variants in record['sources'] for path, _ in variants
+        )
+
+    def picture(self, path):
+        """Cached variant record for a site-relative image path, or None."""
+        if not self.enabled:
+            return None
+        digest = self.source_hash(path)
+        return self.cache['images'].get(digest) if digest else None
+
+    def state(self, paths):
+        # What the markup for `paths` depends on; part of each page's build key
+        return [self.enabled, [(path, self.source_hash(path)) for path in sorted(paths)]]
+
+    def save(self):
+        if not self.enabled:
+            return
+        # Forget (and delete the variants of) images no page references any more
+        live = {self.cache['sources'][path]['hash'] for path in self.used if path in self.cache['sources']}
+        self.cache['sources'] = {p: s for p, s in self.cache['sources'].items() if p in self.used}
+        for digest in list(self.cache['images']):
+            if digest not in live:
+                for _, variants in self.cache['images'].pop(digest)['sources']:
+                    for path, _ in variants:
+                        if os.path.exists(path):
+                            os.remove(path)
+
+        os.makedirs(os.path.dirname(CACHE_PATH), exist_ok=True)
+        with open(CACHE_PATH + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump(self.cache, f, indent=1, sort_keys=True)
+        os.replace(CACHE_PATH + '.tmp', CACHE_PATH)
@@ -1,122 +1,946 @@
 import os
+import re
+import sys
 import glob
-import markdown
-import frontmatter
+import html
+import json
+import filecmp
+import shutil
+import hashlib
+import argparse
+import contextlib
+import io
+import posixpath
+import time
+import unicodedata
+from collections.abc import Iterator
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
 
+import blog_images
+import fs_watch
+import publish
+
 # CONFIGURATION
 POSTS_DIR = '_posts'
 OUTPUT_DIR = 'blog'
 TEMPLATES_DIR = 'templates'
 INDEX_OUTPUT = 'blog.html'
+POSTS_PER_PAGE = 12  # Listing page 1 is e.g. blog.html, the rest blog/page/<n>.html
+BLOG_HEADING = 'The Systems Blog'
+BLOG_INTRO = 'Insights on leadership, burnout, and building systems that scale.'
+
+# --watch: build once saves have been quiet this long (seconds), but never
+# wait longer than WATCH_MAX_WAIT while a burst of saves goes on
+WATCH_DEBOUNCE = 0.1
+WATCH_MAX_WAIT = 1.0
+
+# Build manifest: remembers what each output was built from so unchanged
+# posts are not re-parsed and unchanged files are not rewritten (keeps mtimes
+# stable, so the FTP deploy does not re-upload them).
+MANIFEST_PATH = os.path.join('.build_cache', 'manifest.json')
+MANIFEST_VERSION = 6
+
+# Frontmatter fields the index cards use. Only these are kept in the manifest.
+CARD_FIELDS = ('title', 'date', 'category', 'description', 'image')
+MONTH_RE = re.compile(r'^(\d{4})-(\d{2})')
+
+# Static search index (read in the browser by js/blog-search.js).
+# Tokens are sharded by their first SEARCH_PREFIX_LEN characters and document
+# details by blocks of SEARCH_DOCS_PER_SHARD ids, so a query only downloads
+# the few small files it needs.
+SEARCH_DIR = os.path.join(OUTPUT_DIR, 'search')
+SEARCH_PREFIX_LEN = 2
+SEARCH_DOCS_PER_SHARD = 256
+SEARCH_WEIGHTS = {'title': 8, 'category': 4, 'description': 3, 'body': 1}
+SEARCH_MAX_WEIGHT = 60  # Caps how much one repeated word can dominate a post
+SEARCH_STOP_WORDS = frozenset('''
+    an and are as at be but by can do for from has have how if in into is it its
+    not of on or our so than that the their them then there these they this to
+    was we were what when which who why will with you your
+'''.split())
+SEARCH_TOKEN_RE = re.compile(r'[a-z0-9]+')
+HTML_TAG_RE = re.compile(r'<[^>]+>')
+IMG_TAG_RE = re.compile(r'<img\s[^>]*>')
+IMG_ATTR_RE = re.compile(r'\b(src|alt)="([^"]*)"')
+
+# <picture> sizes hints, matching the blog grid and post column widths
+CARD_IMAGE_SIZES = '(min-width: 1024px) 33vw, (min-width: 768px) 50vw, 100vw'
+FEATURED_IMAGE_SIZES = '(min-width: 768px) 50vw, 100vw'
+POST_IMAGE_SIZES = '(min-width: 800px) 740px, 100vw'
+
+# Template placeholders look like {{title}}; anything else is static text.
+# {{asset:style.css}} expands to the URL of the fingerprinted copy of a file.
+PLACEHOLDER_RE = re.compile(r'\{\{(\w+|asset:[\w./-]+)\}\}')
+
+# Fingerprinted assets: content-hashed copies (style.3f2a9c1b7e.css) that can
+# be cached forever. The manifest maps each original path to its copy.
+ASSET_MANIFEST = 'asset-manifest.json'
+FINGERPRINT_ASSETS = ('style.css',)  # Always in the manifest
+
+_compiled_templates = {}
+
+class Markup(str):
+    """A value that is already HTML and is inserted without escaping."""
 
 def load_template(template_name):
     with open(os.path.join(TEMPLATES_DIR, template_name), 'r', encoding='utf-8') as f:
         return f.read()
 
-def build_blog():
+def compile_template(text):
+    # Split once into [static, slot, static, slot, ..., static]; slot names
+    # sit at the odd indexes. Rendering is then a single join.
+    return tuple(PLACEHOLDER_RE.split(text))
+
+def load_compiled_template(template_name):
+    # Cached per process, keyed on the file's mtime/size so edits are picked up
+    path = os.path.join(TEMPLATES_DIR, template_name)
+    st = os.stat(path)
+    cache_key = (st.st_mtime_ns, st.st_size)
+    cached = _compiled_templates.get(template_name)
+    if cached is None or cached[0] != cache_key:
+        cached = (cache_key, compile_template(load_template(template_name)))
+        _compiled_templates[template_name] = cached
+    return cached[1]
+
+def slot_value(name, context):
+    if name not in context:
+        return '{{' + name + '}}'
+    value = context[name]
+    return value if isinstance(value, Markup) else html.escape(str(value))
+
+def render_template(compiled, context):
+    """Fill a compiled template. Values are HTML-escaped unless wrapped in Markup;
+    placeholders missing from `context` are left as they were."""
+    parts = list(compiled)
+    for i in range(1, len(parts), 2):
+        parts[i] = slot_value(parts[i], context)
+    return ''.join(parts)
+
+def render_template_to(f, compiled, context):
+    """Like render_template, but writes to file `f` as it goes. A value that is
+    an iterator (e.g. a generator of cards) is streamed chunk by chunk as HTML."""
+    for i, part in enumerate(compiled):
+        if i % 2 == 0:
+            f.write(part)
+        elif isinstance(context.get(part), Iterator):
+            for chunk in context[part]:
+                f.write(chunk)
+        else:
+            f.write(slot_value(part, context))
+
+def file_hash(path):
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(65536), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+def inputs_hash(*parts):
+    # Combine several hashes / JSON-able values into one stable key
+    h = hashlib.sha256()
+    for part in parts:
+        h.update(json.dumps(part, sort_keys=True, default=str).encode('utf-8'))
+        h.update(b'\0')
+    return h.hexdigest()
+
+def write_if_changed(path, content):
+    """Write `content` to `path` only if the file would actually change."""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            if f.read() == content:
+                return False
+    except (FileNotFoundError, UnicodeDecodeError):
+        pass
+
+    parent = os.path.dirname(path)
+    if parent:
+        os.makedirs(parent, exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(content)
+    return True
+
+class OutputFile:
+    """Stream text into `path` through a temp file. On close the real file is
+    only replaced if the bytes differ; `changed` says whether it was.
+    A `transform` (e.g. the minifier) needs the whole text, so with one the
+    output is buffered in memory and transformed on close."""
+
+    def __init__(self, path, transform=None):
+        self.path = path
+        self.tmp_path = path + '.tmp'
+        self.transform = transform
+        self.changed = False
+
+    def __enter__(self):
+        parent = os.path.dirname(self.path)
+        if parent:
+            os.makedirs(parent, exist_ok=True)
+        self.f = open(self.tmp_path, 'w', encoding='utf-8')
+        if self.transform:
+            self.buffer = io.StringIO()
+            return self.buffer
+        return self.f
+
+    def __exit__(self, exc_type, exc, tb):
+        if self.transform and exc_type is None:
+            self.f.write(self.transform(self.buffer.getvalue()))
+        self.f.close()
+        if exc_type is not None or (os.path.exists(self.path) and filecmp.cmp(self.tmp_path, self.path, shallow=False)):
+            os.remove(self.tmp_path)
+        else:
+            os.replace(self.tmp_path, self.path)
+            self.changed = True
+        return False
+
+class Assets:
+    """Content-hashed copies of static files, kept next to the original.
+    Hashes are only recomputed when a file's mtime/size change."""
+
+    def __init__(self, known):
+        self.known = known  # path -> {'mtime_ns', 'size', 'hashed'}
+        self.used = set()
+
+    def fingerprint(self, path):
+        try:
+            st = os.stat(path)
+        except OSError:
+            return path  # Leave references to missing files alone
+        entry = self.known.get(path)
+        if (not entry or entry['mtime_ns'] != st.st_mtime_ns or entry['size'] != st.st_size
+                or not os.path.exists(entry['hashed'])):
+            stem, ext = os.path.splitext(path)
+            hashed = f'{stem}.{file_hash(path)[:10]}{ext}'
+            if not os.path.exists(hashed):
+                shutil.copyfile(path, hashed)
+            if entry and entry['hashed'] != hashed and os.path.exists(entry['hashed']):
+                os.remove(entry['hashed'])
+            entry = {'mtime_ns': st.st_mtime_ns, 'size': st.st_size, 'hashed': hashed}
+            self.known[path] = entry
+        self.used.add(path)
+        return entry['hashed']
+
+    def url(self, path, root):
+        return root + url_path(self.fingerprint(path))
+
+    def slots(self, compiled, root):
+        # Context values for every {{asset:...}} placeholder in a template
+        return {
+            name: Markup(html.escape(self.url(name[len('asset:'):], root)))
+            for name in compiled[1::2] if name.startswith('asset:')
+        }
+
+    def save(self):
+        for path in FINGERPRINT_ASSETS:
+            self.fingerprint(path)
+        for path in list(self.known):
+            if path not in self.used:
+                hashed = self.known.pop(path)['hashed']
+                if os.path.exists(hashed):
+                    os.remove(hashed)
+        write_if_changed(ASSET_MANIFEST, json.dumps(
+            {url_path(path): url_path(entry['hashed']) for path, entry in self.known.items()},
+            indent=1, sort_keys=True))
+        return self.known
+
+def load_manifest():
+    try:
+        with open(MANIFEST_PATH, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+        if manifest.get('version') == MANIFEST_VERSION:
+            return manifest
+    except (FileNotFoundError, ValueError):
+        pass
+    return new_manifest()
+
+def new_manifest():
+    return {'version': MANIFEST_VERSION, 'posts': {}, 'index': {}, 'search': None, 'next_doc_id': 0, 'assets': {}}
+
+def save_manifest(manifest):
+    write_if_changed(MANIFEST_PATH, json.dumps(manifest, indent=1, sort_keys=True))
+
+def parse_post(file_path):
+    # Imported lazily so a no-op incremental build never pays for them
+    import markdown
+    import frontmatter
+
+    started = time.perf_counter()
+    with open(file_path, 'r', encoding='utf-8') as f:
+        post = frontmatter.load(f)
+    parsed = time.perf_counter()
+
+    # Basic validation (the caller reports the skip)
+    if 'title' not in post.metadata:
+        return None
+
+    # Helper: Filename slug (e.g., '2023-01-01-my-post.md' -> 'my-post.html')
+    filename = os.path.basename(file_path)
+    slug = filename.replace('.md', '')
+    # If filename starts with date like YYYY-MM-DD, we can strip it for cleaner URLs if desired
+    # For now, let's keep it simple: exact filename mapped to html
+
+    # Convert Markdown to HTML
+    html_content = markdown.markdown(post.content)
+    converted = time.perf_counter()
+
+    post_data = {
+        'metadata': post.metadata,
+        'content': html_content,
+        'slug': slug,
+        'url': f'blog/{slug}.html',
+        'date_obj': post.metadata.get('date', datetime.min)
+    }
+    post_data['terms'] = post_terms(post_data)
+    post_data['images'] = post_images(post_data)
+    # Measured here because posts may be parsed on a --jobs worker process
+    post_data['timings'] = {
+        'frontmatter': parsed - started,
+        'markdown': converted - parsed,
+        'search terms': time.perf_counter() - converted,
+    }
+    return post_data
+
+def post_images(post):
+    # Local images a post page shows: the frontmatter image plus any <img> in the body
+    paths = []
+    if post['metadata'].get('image'):
+        paths.append(site_path(str(post['metadata']['image'])))
+    for tag in IMG_TAG_RE.findall(post['content']):
+        src = dict(IMG_ATTR_RE.findall(tag)).get('src')
+        if src:
+            paths.append(site_path(src, relative_to=OUTPUT_DIR))
+    return sorted({path for path in paths if path})
+
+def search_tokens(text):
+    text = unicodedata.normalize('NFKD', str(text)).lower()
+    return [t for t in SEARCH_TOKEN_RE.findall(text) if len(t) > 1 and t not in SEARCH_STOP_WORDS]
+
+def post_terms(post):
+    # {token: weight} for one post; computed with the parse (in the worker)
+    # and kept in the manifest so unchanged posts never need re-reading.
+    fields = (
+        ('title', post['metadata'].get('title', '')),
+        ('category', post['metadata'].get('category', '')),
+        ('description', post['metadata'].get('description', '')),
+        ('body', html.unescape(HTML_TAG_RE.sub(' ', post['content']))),
+    )
+    terms = {}
+    for field, text in fields:
+        for token in search_tokens(text):
+            terms[token] = terms.get(token, 0) + SEARCH_WEIGHTS[field]
+    return {token: min(weight, SEARCH_MAX_WEIGHT) for token, weight in terms.items()}
+
+def build_search_files(docs):
+    """Turn [(doc_id, card, terms), ...] into {filename: data} for SEARCH_DIR.
+
+    terms-<xx>.json maps each token to a flat [idDelta, weight, ...] list (ids
+    ascending), which keeps the files small and compresses well.
+    docs-<n>.json maps doc id -> [title, url, date, category]."""
+    docs = sorted(docs, key=lambda doc: doc[0])
+    shards = {}
+    doc_blocks = {}
+
+    for doc_id, card, terms in docs:
+        for token, weight in terms.items():
+            shards.setdefault(token[:SEARCH_PREFIX_LEN], {}).setdefault(token, []).extend((doc_id, weight))
+        block = doc_blocks.setdefault(f'docs-{doc_id // SEARCH_DOCS_PER_SHARD}.json', {})
+        block[doc_id] = [card.get('title', ''), card['url'], card.get('date', ''), card.get('category', '')]
+
+    files = {}
+    for prefix, tokens in shards.items():
+        for postings in tokens.values():
+            previous = 0
+            for i in range(0, len(postings), 2):
+                postings[i], previous = postings[i] - previous, postings[i]
+        files[f'terms-{prefix}.json'] = tokens
+    files.update(doc_blocks)
+    files['meta.json'] = {
+        'version': 1,
+        'prefix_len': SEARCH_PREFIX_LEN,
+        'docs_per_shard': SEARCH_DOCS_PER_SHARD,
+        'shards': sorted(shards),
+        'stop_words': sorted(SEARCH_STOP_WORDS),
+    }
+    return files
+
+def write_search_index(docs):
+    files = build_search_files(docs)
+    written = 0
+    for name, data in files.items():
+        if write_if_changed(os.path.join(SEARCH_DIR, name), json.dumps(data, separators=(',', ':'), sort_keys=True)):
+            written += 1
+
+    # Drop shards that no longer have any tokens / documents
+    for path in glob.glob(os.path.join(SEARCH_DIR, '*.json')):
+        if os.path.basename(path) not in files:
+            os.remove(path)
+    return written
+
+def load_post(file_path):
+    # Worker entry point for --jobs: never raises, so one bad post cannot
+    # stop the others. Returns (file_path, post or None, error or None).
+    try:
+        return file_path, parse_post(file_path), None
+    except Exception as e:
+        return file_path, None, f"{type(e).__name__}: {' '.join(str(e).split())}"
+
+def load_posts(file_paths, jobs=1):
+    # Parse + convert posts, in input order, serially or on a process pool
+    if jobs == 1 or len(file_paths) < 2:
+        return [load_post(path) for path in file_paths]
+
+    workers = min(jobs, len(file_paths))
+    chunksize = max(1, len(file_paths) // (workers * 4))
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(load_post, file_paths, chunksize=chunksize))
+
+def post_tags(metadata):
+    # Accept both `tags: [a, b]` and `tags: "a, b"`
+    tags = metadata.get('tags') or []
+    if isinstance(tags, str):
+        tags = tags.split(',')
+    return sorted({str(tag).strip() for tag in tags if str(tag).strip()})
+
+def post_card(post):
+    # The slice of a parsed post the index needs, in JSON-safe form
+    card = {k: str(post['metadata'][k]) for k in CARD_FIELDS if k in post['metadata']}
+    card['url'] = post['url']
+    card['sort_key'] = str(post['date_obj'])
+    card['tags'] = post_tags(post['metadata'])
+    return card
+
+def slugify(name):
+    text = unicodedata.normalize('NFKD', str(name)).encode('ascii', 'ignore').decode('ascii')
+    return re.sub(r'[^a-z0-9]+', '-', text.lower()).strip('-') or 'untitled'
+
+def category_path(category):
+    return os.path.join(OUTPUT_DIR, 'category', f'{slugify(category)}.html')
+
+def tag_path(tag):
+    return os.path.join(OUTPUT_DIR, 'tag', f'{slugify(tag)}.html')
+
+def month_path(month):
+    year, mon = month.split('-')
+    return os.path.join(OUTPUT_DIR, 'archive', year, f'{mon}.html')
+
+def url_path(path):
+    return path.replace(os.sep, '/')
+
+def build_post_index(cards):
+    """Group the (already sorted) cards by category, tag and year-month in one pass.
+    Every archive page is generated from this; nothing is re-parsed per archive."""
+    post_index = {'category': {}, 'tag': {}, 'month': {}}
+    for card in cards:
+        if card.get('category'):
+            post_index['category'].setdefault(card['category'], []).append(card)
+        for tag in card.get('tags', []):
+            post_index['tag'].setdefault(tag, []).append(card)
+        month = MONTH_RE.match(card.get('date', ''))
+        if month:
+            post_index['month'].setdefault(month.group(0), []).append(card)
+    return post_index
+
+def slug_collisions(post_index):
+    # Categories / tags whose archive page another one already has, e.g. the
+    # tags "C++" and "C#" (both blog/tag/c.html): [(kind, name, other name)]
+    collisions = []
+    for kind in ('category', 'tag'):
+        seen = {}
+        for name in sorted(post_index[kind]):
+            other = seen.setdefault(slugify(name), name)
+            if other != name:
+                collisions.append((kind, name, other))
+    return collisions
+
+def listings(cards, post_index):
+    # Every paginated listing: (first page path, heading, intro, cards, active category)
+    yield INDEX_OUTPUT, BLOG_HEADING, BLOG_INTRO, cards, None
+    for category, group in sorted(post_index['category'].items()):
+        yield category_path(category), category, f'Articles filed under {category}.', group, category
+    for tag, group in sorted(post_index['tag'].items()):
+        yield tag_path(tag), f'Tagged: {tag}', f'Articles tagged “{tag}”.', group, None
+    for month, group in sorted(post_index['month'].items(), reverse=True):
+        heading = datetime.strptime(month, '%Y-%m').strftime('%B %Y')
+        yield month_path(month), heading, f'Articles published in {heading}.', group, None
+
+def render_post_tags(tags):
+    if not tags:
+        return ''
+    links = ''.join(
+        f'<a href="../{html.escape(url_path(tag_path(tag)))}">{html.escape(tag)}</a>'
+        for tag in tags
+    )
+    return f'<div class="post-tags">{links}</div>'
+
+def render_post_images(content, pipeline):
+    # Swap body <img> tags for <picture> markup when variants exist. Most
+    # posts have none: a substring check is far cheaper than the regex scan
+    if not pipeline.enabled or '<img' not in content:
+        return content
+
+    def replace(match):
+        attrs = dict(IMG_ATTR_RE.findall(match.group(0)))
+        path = site_path(attrs.get('src', ''), relative_to=OUTPUT_DIR)
+        info = pipeline.picture(path) if path else None
+        if not info:
+            return match.group(0)
+        return blog_images.picture_html(info, '../', alt=html.unescape(attrs.get('alt', '')), sizes=POST_IMAGE_SIZES)
+    return IMG_TAG_RE.sub(replace, content)
+
+def render_hero_image(post, pipeline):
+    path = site_path(str(post['metadata'].get('image', '')))
+    info = pipeline.picture(path) if path else None
+    if not info:
+        return ''
+    alt = str(post['metadata'].get('image_alt', post['metadata'].get('title', '')))
+    return blog_images.picture_html(info, '../', alt=alt, sizes=POST_IMAGE_SIZES, css_class='blog-hero-img', eager=True)
+
+def render_post(post_template, post, pipeline, assets):
+    # post['images'] comes from the parse: no local images, nothing to rewrite
+    content = render_post_images(post['content'], pipeline) if post['images'] else post['content']
+    return render_template(post_template, {
+        **assets.slots(post_template, '../'),
+        'title': post['metadata'].get('title', 'Untitled'),
+        'date': post['metadata'].get('date', ''),
+        'category': post['metadata'].get('category', 'General'),
+        'description': post['metadata'].get('description', ''),
+        'hero_image': Markup(render_hero_image(post, pipeline)),
+        'content': Markup(content),
+        'tags': Markup(render_post_tags(post_tags(post['metadata']))),
+    })
+
+def site_path(url, relative_to=None):
+    # Site-root-relative path of a local URL, or None for remote ones.
+    # Frontmatter image paths starting with '../' are relative to the post
+    # page in /blog; body images are always relative to it (`relative_to`).
+    if url.startswith(('http://', 'https://', '//', 'data:')):
+        return None
+    if url.startswith('/'):
+        return url.lstrip('/')
+    if relative_to is not None or url.startswith('../'):
+        url = posixpath.normpath(posixpath.join((relative_to or OUTPUT_DIR).replace(os.sep, '/'), url))
+    return url
+
+def site_url(url, root):
+    # Make a site URL usable from a page `root` levels deep
+    path = site_path(url)
+    return url if path is None else root + path
+
+def listing_page_path(base_path, page):
+    # blog.html -> blog/page/2.html, blog/category/x.html -> blog/category/x/page/2.html
+    return base_path if page == 1 else os.path.join(os.path.splitext(base_path)[0], 'page', f'{page}.html')
+
+def page_root(path):
+    # Relative prefix from an output file back to the site root
+    return '../' * os.path.normpath(path).count(os.sep)
+
+def render_card(card, root, featured=False):
+    # First post is featured?
+    card_class = "blog-card featured-post" if featured else "blog-card"
+
+    # Fallback image if none provided
+    image_url = site_url(card.get('image_asset') or card.get('image', 'images/default_blog.jpg'), root) # Ensure you have this or handle it
+    if card.get('picture'):
+        sizes = FEATURED_IMAGE_SIZES if featured else CARD_IMAGE_SIZES
+        image_html = blog_images.picture_html(card['picture'], root, sizes=sizes, css_class='blog-card-img')
+    else:
+        image_html = f'<div class="blog-card-img" style="background-image: url(\'{html.escape(image_url)}\'); background-size: cover; background-position: center;"></div>'
+    post_url = html.escape(site_url(card['url'], root))
+    esc = {k: html.escape(v) for k, v in card.items() if isinstance(v, str)}
+
+    meta = esc.get('date', '')
+    if MONTH_RE.match(card.get('date', '')):
+        meta = f'<a href="{html.escape(root + url_path(month_path(card["date"][:7])))}">{meta}</a>'
+    if card.get('category'):
+        category = f'<a href="{html.escape(root + url_path(category_path(card["category"])))}">{esc["category"]}</a>'
+    else:
+        category = 'Blog'
+
+    # Create HTML Card
+    return f"""
+        <article class="{card_class}">
+            {image_html}
+            <div class="blog-card-content">
+                <div class="blog-card-meta">{meta} • {category}</div>
+                <h2 class="blog-card-title"><a href="{post_url}">{esc.get('title')}</a></h2>
+                <p class="blog-card-excerpt">{esc.get('description', '')}</p>
+                <a href="{post_url}" class="blog-card-link">Read Article →</a>
+            </div>
+        </article>
+        """
+
+def render_category_nav(categories, active, root):
+    links = [('All Posts', INDEX_OUTPUT, active is None)]
+    links += [(category, category_path(category), category == active) for category in categories]
+    return '\n                '.join(
+        f'<a href="{html.escape(root + url_path(path))}" class="category-link{" active" if is_active else ""}">{html.escape(label)}</a>'
+        for label, path, is_active in links
+    )
+
+def render_pagination(base_path, page, total_pages, root):
+    if total_pages < 2:
+        return ''
+
+    def link(target):
+        return html.escape(root + url_path(listing_page_path(base_path, target)))
+
+    newer = f'<a href="{link(page - 1)}" class="pagination-link" rel="prev">← Newer Posts</a>' if page > 1 else '<span></span>'
+    older = f'<a href="{link(page + 1)}" class="pagination-link" rel="next">Older Posts →</a>' if page < total_pages else '<span></span>'
+    return f"""<nav class="pagination" aria-label="Blog pages">
+                {newer}
+                <span class="pagination-status">Page {page} of {total_pages}</span>
+                {older}
+            </nav>"""
+
+def write_listing_page(index_template, assets, listing, page_cards, page, total_pages, minify=False):
+    # Cards are generated and written one at a time, never joined into one string
+    base_path, heading, intro, nav = listing
+    path = listing_page_path(base_path, page)
+    root = page_root(path)
+    output = OutputFile(path, publish.minify_html if minify else None)
+    with output as f:
+        render_template_to(f, index_template, {
+            **assets.slots(index_template, root),
+            'root': Markup(root),
+            'page_title': 'Blog' if base_path == INDEX_OUTPUT else f'{heading} | Blog',
+            'heading': heading,
+            'intro': intro,
+            'category_nav': Markup(render_category_nav(nav[0], nav[1], root)),
+            'posts_list': (render_card(card, root, featured=(page == 1 and i == 0)) for i, card in enumerate(page_cards)),
+            'pagination': Markup(render_pagination(base_path, page, total_pages, root)),
+        })
+    return output.changed
+
+class BuildTimer:
+    """Seconds spent in each phase of a build, for --bench. Each lap()
+    charges the time since the previous one, so marking a phase costs one
+    clock read. Names with a ': ' are parts of the phase before the colon."""
+
+    def __init__(self):
+        self.seconds = {}
+        self.last = time.perf_counter()
+
+    def start(self):
+        self.last = time.perf_counter()
+
+    def lap(self, name):
+        now = time.perf_counter()
+        self.add(name, now - self.last)
+        self.last = now
+
+    def add(self, name, seconds):
+        self.seconds[name] = self.seconds.get(name, 0.0) + seconds
+
+def build_blog(force=False, jobs=1, minify=False, precompress=False, timer=None):
     print("🚀 Starting Blog Build Process...")
-    
+    timer = timer or BuildTimer()
+    timer.start()
+
     # 1. Get all markdown files
-    post_files = glob.glob(os.path.join(POSTS_DIR, '*.md'))
-    posts = []
+    post_files = sorted(glob.glob(os.path.join(POSTS_DIR, '*.md')))
+    timer.lap('glob')
 
     if not post_files:
         print("⚠️  No posts found in /_posts. Add some markdown files first!")
         return
 
-    # 2. Parse all posts
-    for file_path in post_files:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            post = frontmatter.load(f)
-            
-            # Basic validation
-            if 'title' not in post.metadata:
-                print(f"Skipping {file_path}: Missing 'title' in frontmatter")
-                continue
-            
-            # Helper: Filename slug (e.g., '2023-01-01-my-post.md' -> 'my-post.html')
-            filename = os.path.basename(file_path)
-            slug = filename.replace('.md', '')
-            # If filename starts with date like YYYY-MM-DD, we can strip it for cleaner URLs if desired
-            # For now, let's keep it simple: exact filename mapped to html
-            
-            # Convert Markdown to HTML
-            html_content = markdown.markdown(post.content)
-            
-            # Store data
-            post_data = {
-                'metadata': post.metadata,
-                'content': html_content,
-                'slug': slug,
-                'url': f'blog/{slug}.html',
-                'date_obj': post.metadata.get('date', datetime.min)
-            }
-            posts.append(post_data)
-
-    # 3. Sort by date (Newest first)
-    posts.sort(key=lambda x: x['date_obj'], reverse=True)
-
-    # 4. Generate Individual Post Pages
-    post_template = load_template('blog_post_template.html')
-    
+    # 2. Hash the build inputs shared by every page
+    manifest = new_manifest() if force else load_manifest()
+    # Includes the minify switch: toggling it rewrites every generated page
+    script_hash = inputs_hash(
+        file_hash(os.path.abspath(__file__)),
+        file_hash(os.path.abspath(blog_images.__file__)),
+        file_hash(os.path.abspath(publish.__file__)),
+        minify,
+    )
+    template_hashes = {
+        os.path.basename(path): file_hash(path)
+        for path in sorted(glob.glob(os.path.join(TEMPLATES_DIR, '*')))
+        if os.path.isfile(path)
+    }
+    # Fingerprinted asset names are part of a template's output, so they are
+    # part of its hash: editing style.css re-renders the pages that link it
+    assets = Assets(manifest.get('assets', {}))
+    post_template = load_compiled_template('blog_post_template.html')
+    index_template = load_compiled_template('blog_index_template.html')
+    post_template_hash = inputs_hash(template_hashes.get('blog_post_template.html'), assets.slots(post_template, ''))
+    index_template_hash = inputs_hash(template_hashes.get('blog_index_template.html'), assets.slots(index_template, ''))
+
     if not os.path.exists(OUTPUT_DIR):
         os.makedirs(OUTPUT_DIR)
 
-    for post in posts:
-        # Prepare replacements
-        output_html = post_template
-        output_html = output_html.replace('{{title}}', post['metadata'].get('title', 'Untitled'))
-        output_html = output_html.replace('{{date}}', str(post['metadata'].get('date', '')))
-        output_html = output_html.replace('{{category}}', post['metadata'].get('category', 'General'))
-        output_html = output_html.replace('{{description}}', post['metadata'].get('description', ''))
-        output_html = output_html.replace('{{content}}', post['content'])
-        
+    # 3. Parse and render only the posts whose inputs changed (the post, the
+    # template, this script and any images the page shows)
+    pipeline = blog_images.ImagePipeline(file_hash)
+    old_entries = manifest['posts']
+    entries = {}
+    source_hashes = {}
+    stale = []
+    rendered = unchanged = 0
+
+    def post_key(source_hash, images):
+        return inputs_hash(source_hash, post_template_hash, script_hash, pipeline.state(images))
+
+    for file_path in post_files:
+        filename = os.path.basename(file_path)
+        source_hash = file_hash(file_path)
+        entry = old_entries.get(filename)
+
+        if (entry and entry['key'] == post_key(source_hash, entry.get('images', []))
+                and (entry['output'] is None or os.path.exists(entry['output']))):
+            entries[filename] = entry
+            unchanged += 1
+            if entry['card'] and entry['card'].get('image_asset'):
+                assets.fingerprint(site_path(entry['card']['image']))  # Still in use
+        else:
+            source_hashes[filename] = source_hash
+            stale.append(file_path)
+    timer.lap('hash inputs')
+
+    errors = []
+    loaded = load_posts(stale, jobs)
+    timer.lap('load posts')
+    for _, post, _ in loaded:
+        for name, seconds in (post or {}).get('timings', {}).items():
+            timer.add(f'load posts: {name}', seconds)
+    pipeline.prepare([path for _, post, _ in loaded if post for path in post['images']], jobs)
+    timer.lap('images')
+
+    for file_path, post, error in loaded:
+        filename = os.path.basename(file_path)
+        timer.lap('post cards')  # The bookkeeping after the previous post
+
+        if error:
+            errors.append((file_path, error))
+            # Keep the last good page; its stale key makes the next build retry
+            if filename in old_entries:
+                entries[filename] = old_entries[filename]
+            continue
+
+        if post is None:
+            print(f"Skipping {file_path}: Missing 'title' in frontmatter")
+            entries[filename] = {'key': post_key(source_hashes[filename], []), 'output': None, 'card': None}
+            continue
+
         # Write file
         output_path = os.path.join(OUTPUT_DIR, f"{post['slug']}.html")
-        with open(output_path, 'w', encoding='utf-8') as f:
-            f.write(output_html)
-        print(f"✅ Generated: {output_path}")
-
-    # 5. Generate Index Page (blog.html)
-    index_template = load_template('blog_index_template.html')
-    posts_html = ""
-
-    for index, post in enumerate(posts):
-        # First post is featured?
-        card_class = "blog-card featured-post" if index == 0 else "blog-card"
-        
-        # Fallback image if none provided
-        image_url = post['metadata'].get('image', 'images/default_blog.jpg') # Ensure you have this or handle it
-        
-        # Create HTML Card
-        card_html = f"""
-        <article class="{card_class}">
-            <div class="blog-card-img" style="background-image: url('{image_url}'); background-size: cover; background-position: center;"></div>
-            <div class="blog-card-content">
-                <div class="blog-card-meta">{post['metadata'].get('date', '')} • {post['metadata'].get('category', 'Blog')}</div>
-                <h2 class="blog-card-title"><a href="{post['url']}">{post['metadata'].get('title')}</a></h2>
-                <p class="blog-card-excerpt">{post['metadata'].get('description', '')}</p>
-                <a href="{post['url']}" class="blog-card-link">Read Article →</a>
-            </div>
-        </article>
-        """
-        posts_html += card_html
+        page_html = render_post(post_template, post, pipeline, assets)
+        if minify:
+            page_html = publish.minify_html(page_html)
+        timer.lap('template fill')
+        if write_if_changed(output_path, page_html):
+            print(f"✅ Generated: {output_path}")
+        timer.lap('file write')
+        rendered += 1
+
+        # Search doc ids stay with a post for its lifetime, so adding a post
+        # only touches the search shards its own words live in
+        old_entry = old_entries.get(filename) or {}
+        doc_id = old_entry.get('doc_id')
+        if doc_id is None:
+            doc_id = manifest['next_doc_id']
+            manifest['next_doc_id'] += 1
+
+        card = post_card(post)
+        image = site_path(card.get('image', ''))
+        card['picture'] = pipeline.picture(image) if image else None
+        if image and not card['picture']:
+            card['image_asset'] = assets.fingerprint(image)
+
+        entries[filename] = {
+            'key': post_key(source_hashes[filename], post['images']),
+            'output': output_path,
+            'card': card,
+            'images': post['images'],
+            'doc_id': doc_id,
+            'terms': post['terms'],
+        }
+
+    timer.lap('post cards')
+    cards = [entries[name]['card'] for name in sorted(entries) if entries[name]['card']]
+
+    # 4. Remove pages whose source post was deleted
+    for filename, entry in old_entries.items():
+        if filename not in entries and entry.get('output') and os.path.exists(entry['output']):
+            os.remove(entry['output'])
+            print(f"🗑️  Removed: {entry['output']}")
+
+    # 5. Sort by date (Newest first)
+    cards.sort(key=lambda x: x['sort_key'], reverse=True)
+
+    # 6. Group the posts once, then generate every paginated listing from
+    # that in-memory index: blog.html plus the category, tag and month
+    # archives. Each page has its own key, so only the pages whose cards
+    # changed (i.e. the archives a changed post belongs to) are rebuilt.
+    post_index = build_post_index(cards)
+    # Two names on one page would overwrite each other: the later one is left
+    # out (and the build fails) until one of them is renamed
+    for kind, name, other in slug_collisions(post_index):
+        del post_index[kind][name]
+        errors.append((f'{kind} "{name}"', f'has the same archive page as "{other}"; rename one of them'))
+    timer.lap('index build')
+    categories = sorted(post_index['category'])
+    old_pages = manifest.get('index') or {}
+    pages = {}
+
+    for base_path, heading, intro, group, active in listings(cards, post_index):
+        listing = (base_path, heading, intro, (categories, active))
+        total_pages = max(1, -(-len(group) // POSTS_PER_PAGE))
+
+        for page in range(1, total_pages + 1):
+            path = listing_page_path(base_path, page)
+            page_cards = group[(page - 1) * POSTS_PER_PAGE:page * POSTS_PER_PAGE]
+            key = inputs_hash(listing, page_cards, page, total_pages, index_template_hash, script_hash)
+            pages[path] = key
+            if old_pages.get(path) == key and os.path.exists(path):
+                continue
 
-    # Inject into index
-    final_index_html = index_template.replace('{{posts_list}}', posts_html)
-    
-    with open(INDEX_OUTPUT, 'w', encoding='utf-8') as f:
-        f.write(final_index_html)
-    
-    print(f"🎉 Blog Index Updated: {INDEX_OUTPUT}")
+            if write_listing_page(index_template, assets, listing, page_cards, page, total_pages, minify):
+                print(f"🎉 Blog Index Updated: {path}")
+
+    # Remove listing pages left over from a longer archive or an emptied group
+    for path in old_pages:
+        if path not in pages and os.path.exists(path):
+            os.remove(path)
+            print(f"🗑️  Removed: {path}")
+    timer.lap('listing pages')
+
+    # 7. Rebuild the search index when any post's searchable content changed
+    searchable = [(name, e['doc_id'], e['key']) for name, e in sorted(entries.items()) if e['card']]
+    search_key = inputs_hash(searchable, script_hash)
+    if manifest.get('search') != search_key or not os.path.exists(os.path.join(SEARCH_DIR, 'meta.json')):
+        written = write_search_index([(e['doc_id'], e['card'], e['terms']) for e in entries.values() if e['card']])
+        if written:
+            print(f"🔎 Search Index Updated: {written} file(s) in {SEARCH_DIR}")
+    timer.lap('search index')
+
+    manifest['posts'] = entries
+    manifest['index'] = pages
+    manifest['search'] = search_key
+    manifest['assets'] = assets.save()
+    save_manifest(manifest)
+    pipeline.save()
+    timer.lap('save manifest')
+
+    # 8. Optional .gz/.br siblings of every publishable text file (generated
+    # and hand-written pages alike) for stripe_server.py / the web server
+    if precompress:
+        files, written, removed = publish.precompress_tree(minify=minify)
+        print(f"🗜️  Precompressed: {written} file(s) written for {files} text file(s)"
+              f"{f', {removed} stale removed' if removed else ''}")
+        timer.lap('precompress')
+
+    print(f"✨ Done: {rendered} rendered, {unchanged} unchanged.")
+
+    if errors:
+        print(f"❌ {len(errors)} build error(s):")
+        for file_path, error in errors:
+            print(f"   {file_path}: {error}")
+    return errors
+
+def watched_paths():
+    """Files outside /_posts and /templates the last build depended on:
+    images the posts show and the static assets the templates fingerprint."""
+    manifest = load_manifest()
+    paths = set(manifest.get('assets', {}))
+    for entry in manifest['posts'].values():
+        paths.update(entry.get('images', []))
+        if entry.get('card') and entry['card'].get('image'):
+            paths.add(site_path(entry['card']['image']))
+    return {os.path.normpath(path) for path in paths if path}
+
+def watch(jobs=1, minify=False, precompress=False):
+    """Rebuild whenever a post, template, image or asset changes. The build is
+    incremental, so a save only re-renders that post and its listing pages."""
+    build_blog(jobs=jobs, minify=minify, precompress=precompress)
+    extra = watched_paths()
+    watcher = fs_watch.DirectoryWatcher({POSTS_DIR, TEMPLATES_DIR} | {os.path.dirname(p) or '.' for p in extra})
+    print(f"👀 Watching {POSTS_DIR}/, {TEMPLATES_DIR}/ and {len(extra)} file(s) ({watcher.backend}). Ctrl+C to stop.")
+
+    def relevant(path):
+        path = os.path.normpath(path)
+        directory = os.path.dirname(path)
+        if directory == os.path.normpath(POSTS_DIR):
+            return path.endswith('.md')
+        return directory == os.path.normpath(TEMPLATES_DIR) or path in extra
+
+    with watcher:
+        while True:
+            changed = watcher.changes()
+            if not any(map(relevant, changed)):
+                continue
+            # Editors often save in several steps; build once per burst
+            changed = fs_watch.wait_for_quiet(watcher, changed, WATCH_DEBOUNCE, WATCH_MAX_WAIT)
+            started = time.perf_counter()
+            print(f"\n🔁 Changed: {', '.join(sorted(p for p in changed if relevant(p)))}")
+            try:
+                build_blog(jobs=jobs, minify=minify, precompress=precompress)
+            except Exception as e:
+                print(f"❌ An error occurred: {e}")
+            print(f"⏱️  Rebuilt in {time.perf_counter() - started:.2f}s")
+
+            # Posts may have started (or stopped) showing an image
+            extra = watched_paths()
+            watcher.set_directories({POSTS_DIR, TEMPLATES_DIR} | {os.path.dirname(p) or '.' for p in extra})
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the static blog from /_posts.")
+    parser.add_argument('--force', action='store_true',
+                        help="ignore the build manifest and re-render every post")
+    parser.add_argument('--jobs', '-j', type=int, default=1, metavar='N',
+                        help="parse and render posts on N processes (0 = one per CPU)")
+    parser.add_argument('--minify', action='store_true',
+                        help="minify generated HTML (and the CSS in precompressed copies)")
+    parser.add_argument('--precompress', action='store_true',
+                        help="write .gz/.br copies of the site's text files at maximum compression")
+    parser.add_argument('--watch', action='store_true',
+                        help="keep running and rebuild as soon as posts, templates or images change")
+    parser.add_argument('--bench', action='store_true',
+                        help="time each build phase on synthetic corpora instead of building the site")
+    parser.add_argument('--bench-sizes', default='10,1000,10000', metavar='N,N',
+                        help="post counts for --bench (default 10,1000,10000)")
+    parser.add_argument('--profile', metavar='FILE',
+                        help="run under cProfile, save the stats to FILE and print the top functions")
+    parser.add_argument('--tracemalloc', action='store_true',
+                        help="trace memory: report the peak and the largest allocation sites")
+    args = parser.parse_args()
+
+    if args.bench or args.profile or args.tracemalloc:
+        from benchmarks import blog_bench
+
+        if (args.profile or args.tracemalloc) and args.jobs != 1:
+            print("ℹ️  --profile/--tracemalloc only see this process; use --jobs 1 to include post parsing")
+
+        with contextlib.ExitStack() as stack:
+            if args.profile:
+                stack.enter_context(blog_bench.profiled(args.profile))
+            if args.tracemalloc:
+                stack.enter_context(blog_bench.traced_memory())
+            if args.bench:
+                blog_bench.bench([int(n) for n in args.bench_sizes.split(',')],
+                                 jobs=args.jobs or os.cpu_count() or 1, minify=args.minify)
+            else:
+                errors = build_blog(force=args.force, jobs=args.jobs or os.cpu_count() or 1,
+                                    minify=args.minify, precompress=args.precompress)
+        sys.exit(1 if not args.bench and errors else 0)
+
+    if args.watch:
+        try:
+            watch(jobs=args.jobs or os.cpu_count() or 1, minify=args.minify, precompress=args.precompress)
+        except KeyboardInterrupt:
+            print("\n👋 Stopped watching.")
+        sys.exit(0)
+
     try:
-        build_blog()
+        errors = build_blog(force=args.force, jobs=args.jobs or os.cpu_count() or 1,
+                            minify=args.minify, precompress=args.precompress)
     except ImportError as e:
         print("❌ Error: Missing Dependencies.")
         print(f"Details: {e}")
         print("Please run: pip install markdown python-frontmatter")
+        sys.exit(1)
     except Exception as e:
         print(f"❌ An error occurred: {e}")
+        sys.exit(1)
+    if errors:
+        sys.exit(1)
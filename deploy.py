@@ -0,0 +1,332 @@
+"""
+FTP Deploy
+Uploads only what changed since the last deploy, instead of the whole tree.
+
+1. content_manifest(): a sha256 + size for every publishable file
+   (publish.publishable_files: no sources, templates, .env, Python or paid
+   PDFs; `python deploy.py --list` prints them)
+2. the manifest of the last deploy is read back from the server (none
+   there = first deploy). It lists every file and its hash, so it is kept
+   outside the web root: MANIFEST_NAME next to the server directory, or
+   EXPOSED_MANIFEST_NAME when FTP_DIR is empty (the login directory is the
+   web root). Apache and LiteSpeed refuse to serve .ht* files.
+3. new and changed files are uploaded, and files that left the site are
+   deleted, in parallel over a pool of reused FTP connections. Assets go
+   first and pages last, so a page never links to an asset not there yet;
+   each file is written under a temporary name and renamed into place.
+4. the manifest of what is now on the server is uploaded last. If a deploy
+   fails half way, the next one picks up whatever is still different.
+
+Settings come from the environment (as in the GitHub workflow):
+  FTP_HOST, FTP_USER, FTP_PASSWORD    required
+  FTP_PORT                            default 21
+  FTP_DIR                             server directory (default public_html)
+  FTP_TLS=1                           explicit FTPS
+
+    python deploy.py --list             what is published, with sizes (no FTP)
+    python deploy.py --dry-run          show what would be sent
+    python deploy.py --connections 8
+"""
+
+import io
+import os
+import sys
+import json
+import time
+import queue
+import ftplib
+import argparse
+import posixpath
+import contextlib
+from concurrent.futures import ThreadPoolExecutor
+
+import publish
+from build_blog import file_hash
+
+MANIFEST_NAME = '.deploy-manifest.json'
+EXPOSED_MANIFEST_NAME = '.htdeploy-manifest.json'
+LOCAL_MANIFEST = os.path.join('.build_cache', 'deploy-manifest.json')
+UPLOAD_SUFFIX = '.deploy-tmp'
+DEFAULT_CONNECTIONS = 4
+FTP_TIMEOUT = 60
+BLOCK_SIZE = 64 * 1024
+RETRIES = 3
+# Dropped connections and 4xx replies are worth another try; 5xx are not
+TRANSIENT_ERRORS = (ftplib.error_temp, ftplib.error_reply, OSError, EOFError)
+
+
+def ftp_settings():
+    missing = [name for name in ('FTP_HOST', 'FTP_USER', 'FTP_PASSWORD') if not os.environ.get(name)]
+    if missing:
+        raise SystemExit(f"❌ Missing FTP settings: {', '.join(missing)}")
+    return {
+        'host': os.environ['FTP_HOST'],
+        'port': int(os.environ.get('FTP_PORT', '21')),
+        'user': os.environ['FTP_USER'],
+        'password': os.environ['FTP_PASSWORD'],
+        'directory': os.environ.get('FTP_DIR', 'public_html'),
+        'tls': os.environ.get('FTP_TLS', '').lower() in ('1', 'true', 'yes'),
+    }
+
+
+class FtpPool:
+    """Logged-in connections, each reused for many transfers. A connection is
+    opened only when no idle one is left, so there are never more than
+    threads using the pool."""
+
+    def __init__(self, settings):
+        self.settings = settings
+        self.idle = queue.LifoQueue()
+
+    def connect(self):
+        s = self.settings
+        ftp = ftplib.FTP_TLS(timeout=FTP_TIMEOUT) if s['tls'] else ftplib.FTP(timeout=FTP_TIMEOUT)
+        ftp.connect(s['host'], s['port'])
+        ftp.login(s['user'], s['password'])
+        if s['tls']:
+            ftp.prot_p()
+        if s['directory']:
+            ftp.cwd(s['directory'])
+        return ftp
+
+    @contextlib.contextmanager
+    def connection(self):
+        try:
+            ftp = self.idle.get_nowait()
+        except queue.Empty:
+            ftp = self.connect()
+        try:
+            yield ftp
+        except ftplib.error_perm:
+            self.idle.put(ftp)  # Refused, but the connection is fine
+            raise
+        except BaseException:
+            ftp.close()  # Possibly broken: not handed out again
+            raise
+        self.idle.put(ftp)
+
+    def run(self, action, *args):
+        """action(ftp, *args) on a pooled connection, retried on transient errors"""
+        for attempt in range(RETRIES):
+            try:
+                with self.connection() as ftp:
+                    return action(ftp, *args)
+            except TRANSIENT_ERRORS:
+                if attempt == RETRIES - 1:
+                    raise
+                time.sleep(2 ** attempt)
+
+    def close(self):
+        while True:
+            try:
+                ftp = self.idle.get_nowait()
+            except queue.Empty:
+                return
+            try:
+                ftp.quit()
+            except (ftplib.Error, OSError, EOFError):
+                ftp.close()
+
+
+def _missing(error):
+    return str(error).startswith('550')
+
+
+def manifest_path(settings):
+    """Where the server's manifest lives, relative to the server directory"""
+    if settings['directory']:
+        return posixpath.join('..', MANIFEST_NAME)
+    return EXPOSED_MANIFEST_NAME
+
+
+def read_remote_manifest(ftp, path):
+    buffer = io.BytesIO()
+    try:
+        ftp.retrbinary(f'RETR {path}', buffer.write)
+    except ftplib.error_perm as e:
+        if _missing(e):
+            return {}
+        raise
+    return json.loads(buffer.getvalue().decode('utf-8')).get('files', {})
+
+
+def store(ftp, path, stream):
+    """Write `path` under a temporary name, then rename it over the old file"""
+    temporary = path + UPLOAD_SUFFIX
+    ftp.storbinary(f'STOR {temporary}', stream, blocksize=BLOCK_SIZE)
+    try:
+        ftp.rename(temporary, path)
+    except ftplib.error_perm:
+        # Some servers will not rename over an existing file
+        ftp.delete(path)
+        ftp.rename(temporary, path)
+
+
+def upload_file(ftp, root, path):
+    with open(os.path.join(root, path), 'rb') as f:
+        store(ftp, path, f)
+
+
+def delete_file(ftp, path):
+    try:
+        ftp.delete(path)
+    except ftplib.error_perm as e:
+        if not _missing(e):
+            raise
+
+
+def make_directories(ftp, directories):
+    for directory in sorted(directories, key=lambda d: d.count('/')):
+        try:
+            ftp.mkd(directory)
+        except ftplib.error_perm:
+            pass  # Already there
+
+
+def remove_directories(ftp, directories):
+    for directory in sorted(directories, key=lambda d: -d.count('/')):
+        try:
+            ftp.rmd(directory)
+        except ftplib.error_perm:
+            pass  # Not empty (files the manifest does not know about)
+
+
+def parent_directories(paths):
+    directories = set()
+    for path in paths:
+        directory = posixpath.dirname(path)
+        while directory and directory not in directories:
+            directories.add(directory)
+            directory = posixpath.dirname(directory)
+    return directories
+
+
+def content_manifest(root='.'):
+    """{site-relative path: {'sha256', 'size'}} for every publishable file."""
+    return {
+        rel_path: {'sha256': file_hash(os.path.join(root, rel_path)), 'size': os.path.getsize(os.path.join(root, rel_path))}
+        for rel_path in publish.publishable_files(root)
+    }
+
+
+def list_publishable(root='.'):
+    """Print the publish set with sizes, to check nothing private is in it"""
+    paths = publish.publishable_files(root)
+    total = 0
+    for path in paths:
+        size = os.path.getsize(os.path.join(root, path))
+        total += size
+        print(f"{size:>12,}  {path}")
+    print(f"📦 {len(paths)} publishable file(s), {total / 1e6:.2f} MB")
+
+
+def plan(local, deployed, force=False):
+    """(paths to upload, paths to delete) to turn `deployed` into `local`"""
+    upload = sorted(p for p, entry in local.items()
+                    if force or deployed.get(p, {}).get('sha256') != entry['sha256'])
+    delete = sorted(p for p in deployed if p not in local)
+    return upload, delete
+
+
+def write_local_manifest(root, manifest):
+    path = os.path.join(root, LOCAL_MANIFEST)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({'files': manifest}, f, indent=1, sort_keys=True)
+
+
+def deploy(root='.', settings=None, connections=DEFAULT_CONNECTIONS, dry_run=False, force=False, verbose=False):
+    """Bring the server directory in line with the publishable tree under
+    `root`. Returns a summary dict; raises if any transfer failed."""
+    started = time.perf_counter()
+    settings = settings or ftp_settings()
+    local = content_manifest(root)
+    write_local_manifest(root, local)
+
+    pool = FtpPool(settings)
+    try:
+        manifest = manifest_path(settings)
+        deployed = pool.run(read_remote_manifest, manifest)
+        upload, delete = plan(local, deployed, force)
+        upload_bytes = sum(local[p]['size'] for p in upload)
+        summary = {
+            'uploaded': len(upload), 'deleted': len(delete), 'unchanged': len(local) - len(upload),
+            'bytes': upload_bytes, 'total_bytes': sum(e['size'] for e in local.values()),
+        }
+
+        print(f"📦 {len(local)} publishable file(s): {len(upload)} to upload ({upload_bytes / 1e6:.2f} MB), "
+              f"{len(delete)} to delete, {summary['unchanged']} unchanged"
+              f"{'' if deployed else ' (no manifest on the server: full upload)'}")
+        if verbose or dry_run:
+            for path in upload:
+                print(f"   ⬆️  {path}")
+            for path in delete:
+                print(f"   🗑️  {path}")
+        if dry_run or not (upload or delete):
+            return summary
+
+        # The manifest always describes what actually reached the server
+        result = dict(deployed)
+        failures = []
+
+        pool.run(make_directories, parent_directories(upload) - parent_directories(deployed))
+        pages = [p for p in upload if p.endswith(('.html', '.html.gz', '.html.br'))]
+        assets = sorted(set(upload) - set(pages))
+        with ThreadPoolExecutor(max_workers=max(1, connections)) as executor:
+            for batch in (assets, pages):
+                futures = {path: executor.submit(pool.run, upload_file, root, path) for path in batch}
+                for path, future in futures.items():
+                    try:
+                        future.result()
+                        result[path] = local[path]
+                    except (ftplib.Error, *TRANSIENT_ERRORS) as e:
+                        failures.append((path, e))
+            futures = {path: executor.submit(pool.run, delete_file, path) for path in delete}
+            for path, future in futures.items():
+                try:
+                    future.result()
+                    result.pop(path, None)
+                except (ftplib.Error, *TRANSIENT_ERRORS) as e:
+                    failures.append((path, e))
+        pool.run(remove_directories, parent_directories(deployed) - parent_directories(local))
+
+        data = json.dumps({'files': result}, sort_keys=True).encode('utf-8')
+        pool.run(store, manifest, io.BytesIO(data))
+    finally:
+        pool.close()
+
+    if failures:
+        for path, e in failures:
+            print(f"❌ {path}: {e}")
+        raise RuntimeError(f"{len(failures)} file(s) failed; the next deploy will retry them")
+
+    summary['seconds'] = time.perf_counter() - started
+    print(f"🚀 Deployed in {summary['seconds']:.1f}s: {len(upload)} uploaded, {len(delete)} deleted "
+          f"({upload_bytes / 1e6:.2f} of {summary['total_bytes'] / 1e6:.2f} MB sent)")
+    return summary
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Upload the changed files of the site over FTP.")
+    parser.add_argument('--list', action='store_true',
+                        help="print every file that would be published, with its size, and exit")
+    parser.add_argument('--dry-run', action='store_true',
+                        help="compare with the server's manifest and list the changes, without sending anything")
+    parser.add_argument('--connections', '-c', type=int, metavar='N',
+                        default=int(os.environ.get('DEPLOY_CONNECTIONS', DEFAULT_CONNECTIONS)),
+                        help=f"parallel FTP connections (default {DEFAULT_CONNECTIONS})")
+    parser.add_argument('--force', action='store_true',
+                        help="upload every file, whatever the server's manifest says")
+    parser.add_argument('--verbose', '-v', action='store_true',
+                        help="list every file uploaded or deleted")
+    args = parser.parse_args()
+
+    if args.list:
+        list_publishable()
+        sys.exit(0)
+
+    try:
+        deploy(connections=args.connections, dry_run=args.dry_run, force=args.force, verbose=args.verbose)
+    except (RuntimeError, ftplib.Error, OSError) as e:
+        print(f"❌ Deploy failed: {e}")
+        sys.exit(1)
@@ -0,0 +1,176 @@
+"""
+File Delivery
+Sends large files (the protected PDFs) with full HTTP caching and Range support:
+
+- Strong ETag and Last-Modified; If-None-Match / If-Modified-Since give 304.
+- Range requests, including several ranges at once (multipart/byteranges),
+  guarded by If-Range so a resumed download never mixes two file versions.
+- The whole file, or a range that runs to the end of it (the usual
+  "resume from byte N" request), goes out through the server's
+  wsgi.file_wrapper. Servers such as gunicorn turn that into os.sendfile(),
+  so the bytes never pass through a Python worker.
+
+Other ranges are read with os.pread() in blocks, never loaded whole.
+"""
+
+import os
+import secrets
+
+from werkzeug.http import http_date, parse_date, parse_etags, parse_range_header
+from werkzeug.wrappers import Response
+from werkzeug.wsgi import FileWrapper
+
+BLOCK_SIZE = 64 * 1024
+MAX_RANGES = 16  # More (or overlapping) ranges than this get the whole file
+
+
+def file_etag(st):
+    """Strong validator from the file's mtime and size"""
+    return f'{st.st_mtime_ns:x}-{st.st_size:x}'
+
+
+def send_file_ranges(environ, path, mimetype, download_name=None, etag=None, cache_control='private, no-cache'):
+    """A Response for `path` honouring the request's conditional and Range
+    headers. `etag` (unquoted) overrides the mtime/size-based one."""
+    f = open(path, 'rb')
+    try:
+        st = os.fstat(f.fileno())
+        length = st.st_size
+        etag = etag or file_etag(st)
+        headers = {
+            'ETag': f'"{etag}"',
+            'Last-Modified': http_date(st.st_mtime),
+            'Accept-Ranges': 'bytes',
+            'Cache-Control': cache_control,
+        }
+
+        if not_modified(environ, etag, st.st_mtime):
+            f.close()
+            return Response(status=304, headers=headers)
+
+        response = Response(mimetype=mimetype, headers=headers, direct_passthrough=True)
+        if download_name:
+            response.headers.set('Content-Disposition', 'attachment', filename=download_name)
+
+        ranges = requested_ranges(environ, length, etag, st.st_mtime)
+        if ranges == []:
+            f.close()
+            response.status_code = 416
+            response.headers['Content-Range'] = f'bytes */{length}'
+            return response
+
+        head = environ.get('REQUEST_METHOD') == 'HEAD'
+        if ranges is None:
+            response.content_length = length
+            response.response = [] if head else wrap_file(environ, f)
+        elif len(ranges) == 1:
+            start, stop = ranges[0]
+            response.status_code = 206
+            response.headers['Content-Range'] = f'bytes {start}-{stop - 1}/{length}'
+            response.content_length = stop - start
+            if head:
+                response.response = []
+            elif stop == length:
+                f.seek(start)  # file_wrapper / sendfile start at the current offset
+                response.response = wrap_file(environ, f)
+            else:
+                response.response = read_ranges(f, [(start, stop)])
+        else:
+            boundary = secrets.token_hex(16)
+            parts = [
+                (f'--{boundary}\r\nContent-Type: {mimetype}\r\n'
+                 f'Content-Range: bytes {start}-{stop - 1}/{length}\r\n\r\n').encode('ascii')
+                for start, stop in ranges
+            ]
+            closing = f'--{boundary}--\r\n'.encode('ascii')
+            response.status_code = 206
+            response.headers['Content-Type'] = f'multipart/byteranges; boundary={boundary}'
+            response.content_length = (sum(len(p) + 2 for p in parts) + len(closing)
+                                       + sum(stop - start for start, stop in ranges))
+            response.response = [] if head else multipart_body(f, ranges, parts, closing)
+
+        if head:
+            f.close()
+        return response
+    except BaseException:
+        f.close()
+        raise
+
+
+def not_modified(environ, etag, mtime):
+    if_none_match = environ.get('HTTP_IF_NONE_MATCH')
+    if if_none_match:
+        # Weak comparison (RFC 9110 13.1.2)
+        return parse_etags(if_none_match).contains_weak(etag)
+    since = parse_date(environ.get('HTTP_IF_MODIFIED_SINCE'))
+    return since is not None and int(mtime) <= since.timestamp()
+
+
+def requested_ranges(environ, length, etag, mtime):
+    """[(start, stop), ...] to send, None for the whole file, [] if unsatisfiable."""
+    if environ.get('REQUEST_METHOD') not in ('GET', 'HEAD') or not length:
+        return None
+    parsed = parse_range_header(environ.get('HTTP_RANGE'))
+    if parsed is None or parsed.units != 'bytes':
+        return None
+
+    # If-Range: only send part of the file if it is still the version the
+    # client has the rest of; otherwise send all of it
+    if_range = environ.get('HTTP_IF_RANGE')
+    if if_range:
+        if if_range.startswith('W/'):
+            return None  # Weak validators never match If-Range
+        if if_range.startswith('"'):
+            if if_range.strip('"') != etag:
+                return None
+        else:
+            date = parse_date(if_range)
+            if date is None or int(mtime) != date.timestamp():
+                return None
+
+    ranges = []
+    for start, stop in parsed.ranges:
+        if start < 0:  # Suffix range: the last -start bytes
+            start, stop = max(0, length + start), length
+        else:
+            stop = length if stop is None else min(stop, length)
+        if start < stop:
+            ranges.append((start, stop))
+    if not ranges:
+        return []
+
+    ranges.sort()
+    overlapping = any(b[0] < a[1] for a, b in zip(ranges, ranges[1:]))
+    if len(ranges) > MAX_RANGES or overlapping:
+        return None
+    return ranges
+
+
+def wrap_file(environ, f):
+    return environ.get('wsgi.file_wrapper', FileWrapper)(f, BLOCK_SIZE)
+
+
+def read_ranges(f, ranges):
+    with f:
+        fd = f.fileno()
+        for start, stop in ranges:
+            yield from read_span(fd, start, stop)
+
+
+def read_span(fd, start, stop):
+    while start < stop:
+        block = os.pread(fd, min(BLOCK_SIZE, stop - start), start)
+        if not block:
+            return
+        start += len(block)
+        yield block
+
+
+def multipart_body(f, ranges, parts, closing):
+    with f:
+        fd = f.fileno()
+        for (start, stop), part in zip(ranges, parts):
+            yield part
+            yield from read_span(fd, start, stop)
+            yield b'\r\n'
+        yield closing
@@ -0,0 +1,198 @@
+"""
+File System Watching
+Reports which files in a set of directories were created, changed or removed.
+
+On Linux this uses inotify (through ctypes, so there is nothing to install):
+the kernel wakes us up as soon as a file is written. Anywhere else, or if
+inotify is unavailable (e.g. the watch limit is reached), the directories are
+polled every POLL_INTERVAL seconds and compared by mtime/size.
+
+Directories are watched non-recursively; callers filter the returned paths
+down to the files they care about.
+"""
+
+import os
+import time
+import ctypes
+import ctypes.util
+import select
+import struct
+
+POLL_INTERVAL = 0.25  # Seconds between scans when polling
+
+# inotify constants from <sys/inotify.h>
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+WATCH_MASK = (IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO
+              | IN_CREATE | IN_DELETE | IN_ONLYDIR)
+EVENT_HEADER = struct.Struct('iIII')  # wd, mask, cookie, len
+
+
+def _load_libc():
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        libc.inotify_init1, libc.inotify_add_watch, libc.inotify_rm_watch
+        return libc
+    except (OSError, AttributeError):
+        return None
+
+
+class DirectoryWatcher:
+    """Watch `directories`; changes() returns the paths that changed."""
+
+    def __init__(self, directories, poll_interval=POLL_INTERVAL, use_inotify=True):
+        self.poll_interval = poll_interval
+        self.directories = set()
+        self.fd = None
+        self.watches = {}  # inotify watch descriptor -> directory
+        self.snapshot = {}  # polling: path -> (mtime_ns, size)
+
+        libc = _load_libc() if use_inotify else None
+        if libc is not None:
+            fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+            if fd >= 0:
+                self.libc, self.fd = libc, fd
+        self.set_directories(directories)
+
+    @property
+    def backend(self):
+        return 'inotify' if self.fd is not None else 'polling'
+
+    def set_directories(self, directories):
+        """Change the watched set, e.g. when a post starts referencing a new image folder."""
+        directories = {os.path.normpath(d) for d in directories}
+        for directory in self.directories - directories:
+            self._remove(directory)
+        for directory in directories - self.directories:
+            self._add(directory)
+
+    def _add(self, directory):
+        # Watched set first, so a fall back to polling rescans this directory too
+        self.directories.add(directory)
+        if self.fd is not None and os.path.isdir(directory):
+            wd = self.libc.inotify_add_watch(self.fd, os.fsencode(directory), WATCH_MASK)
+            if wd >= 0:
+                self.watches[wd] = directory
+                return
+            # Out of watches (ENOSPC) or similar: poll everything instead
+            self._fall_back_to_polling()
+            return
+        self.snapshot.update(self._scan(directory))
+
+    def _remove(self, directory):
+        self.directories.discard(directory)
+        for wd, watched in list(self.watches.items()):
+            if watched == directory:
+                self.libc.inotify_rm_watch(self.fd, wd)
+                del self.watches[wd]
+        self.snapshot = {p: s for p, s in self.snapshot.items() if os.path.dirname(p) != directory}
+
+    def _fall_back_to_polling(self):
+        self.close()
+        for directory in self.directories:
+            self.snapshot.update(self._scan(directory))
+
+    def _scan(self, directory):
+        found = {}
+        try:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    try:
+                        st = entry.stat()
+                    except OSError:
+                        continue
+                    found[os.path.join(directory, entry.name)] = (st.st_mtime_ns, st.st_size)
+        except OSError:
+            pass
+        return found
+
+    def changes(self, timeout=None):
+        """Block until something changes (or `timeout` seconds pass) and
+        return the set of changed paths. timeout=0 just checks."""
+        if self.fd is not None:
+            return self._read_events(timeout)
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            changed = self._poll()
+            if changed:
+                return changed
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                return set()
+            time.sleep(self.poll_interval if remaining is None else min(self.poll_interval, remaining))
+
+    def _poll(self):
+        current = {}
+        for directory in self.directories:
+            current.update(self._scan(directory))
+        changed = {p for p in current.keys() | self.snapshot.keys() if current.get(p) != self.snapshot.get(p)}
+        self.snapshot = current
+        return changed
+
+    def _read_events(self, timeout):
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable:
+            return set()
+
+        changed = set()
+        while True:
+            try:
+                data = os.read(self.fd, 64 * 1024)
+            except BlockingIOError:
+                break
+            offset = 0
+            while offset < len(data):
+                wd, mask, _, length = EVENT_HEADER.unpack_from(data, offset)
+                offset += EVENT_HEADER.size
+                name = data[offset:offset + length].rstrip(b'\0')
+                offset += length
+
+                if mask & IN_Q_OVERFLOW:
+                    # Events were dropped: report everything as changed
+                    changed.update(os.path.join(d, n) for d in self.directories
+                                   if os.path.isdir(d) for n in os.listdir(d))
+                elif mask & IN_IGNORED:
+                    self.watches.pop(wd, None)  # Directory removed
+                elif wd in self.watches and name:
+                    changed.add(os.path.join(self.watches[wd], os.fsdecode(name)))
+        return changed
+
+    def close(self):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+            self.watches = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+
+def wait_for_quiet(watcher, first, debounce, max_wait=None):
+    """Collect further changes after `first` until none arrive for
+    `debounce` seconds (or `max_wait` passes), so one burst of saves is
+    handled once. Returns all changed paths."""
+    changed = set(first)
+    started = time.monotonic()
+    while True:
+        timeout = debounce
+        if max_wait is not None:
+            timeout = min(timeout, max(0, started + max_wait - time.monotonic()))
+        more = watcher.changes(timeout) if timeout > 0 else set()
+        if not more:
+            return changed
+        changed |= more
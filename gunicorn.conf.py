@@ -0,0 +1,69 @@
+"""
+Gunicorn Configuration
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+Every setting can be overridden from the environment:
+  BIND                   address to listen on (default 127.0.0.1:8000, behind nginx)
+  WEB_CONCURRENCY        worker processes (default 2 x CPUs + 1)
+  WEB_THREADS            threads per worker (default 8); requests mostly wait
+                         on Stripe or the disk, so threads are cheap concurrency
+  WEB_TIMEOUT            seconds a silent worker is given before it is restarted
+  WEB_MAX_REQUESTS       recycle a worker after this many requests (0 = never)
+  METRICS_DIR            where workers leave their metrics for /metrics to add up
+                         (default .data/metrics)
+
+Graceful reload:
+  kill -HUP <master pid>    new workers with re-read config; old workers finish
+                            their requests first (up to graceful_timeout).
+                            With preload_app the code itself is not re-imported:
+  kill -USR2 <master pid>   starts a new master on the new code next to the old
+                            one; then `kill -QUIT <old master pid>`. No request
+                            is dropped.
+"""
+
+import os
+import multiprocessing
+
+from metrics import ProcessSnapshots
+
+bind = os.environ.get('BIND', '127.0.0.1:8000')
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1))
+threads = int(os.environ.get('WEB_THREADS', '8'))
+worker_class = 'gthread'
+
+# Import the app once in the master; workers fork with it already loaded.
+# Nothing that must not cross a fork (SQLite connections, threads) is opened
+# before the first request.
+preload_app = True
+
+timeout = int(os.environ.get('WEB_TIMEOUT', '30'))
+graceful_timeout = 30
+keepalive = 5
+
+# Recycle workers now and then (staggered) so slow leaks cannot build up
+max_requests = int(os.environ.get('WEB_MAX_REQUESTS', '2000'))
+max_requests_jitter = max_requests // 10
+
+accesslog = '-'
+errorlog = '-'
+
+# Set before the app is imported, so every worker shares the directory
+METRICS_DIR = os.environ.setdefault(
+    'METRICS_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), '.data', 'metrics'))
+
+
+def on_starting(server):
+    # Counters start from zero with each master, as Prometheus expects
+    ProcessSnapshots(METRICS_DIR).clear()
+
+
+def worker_exit(server, worker):
+    # Let webhook workers finish the event in hand and save the final metrics
+    app = worker.wsgi
+    if app is not None:
+        app.extensions['stripe_server'].close()
+
+
+def child_exit(server, worker):
+    # In the master: keep the exited worker's counts in the retired totals
+    ProcessSnapshots(METRICS_DIR).retire(worker.pid)
@@ -0,0 +1,128 @@
+/*
+ * Blog search widget.
+ *
+ * Reads the static index build_blog.py writes to blog/search/:
+ *   meta.json          shard list, layout and stop words
+ *   terms-<xx>.json    postings for every token starting with <xx>
+ *   docs-<n>.json      title/url/date/category for a block of document ids
+ *
+ * Only the shards a query touches are downloaded, and each one only once.
+ */
+(() => {
+    const MAX_RESULTS = 8;
+    const DEBOUNCE_MS = 120;
+
+    const form = document.querySelector('.blog-search');
+    if (!form || !window.fetch) return;
+
+    const input = form.querySelector('input');
+    const results = form.querySelector('.blog-search-results');
+    const siteRoot = new URL(form.dataset.siteRoot || '', window.location.href);
+    const indexRoot = new URL('blog/search/', siteRoot);
+    const cache = new Map();
+
+    const load = (name) => {
+        if (!cache.has(name)) {
+            cache.set(name, fetch(new URL(name, indexRoot))
+                .then((response) => (response.ok ? response.json() : null))
+                .catch(() => null));
+        }
+        return cache.get(name);
+    };
+
+    const tokenize = (text, stopWords) => (
+        text.normalize('NFKD').toLowerCase().match(/[a-z0-9]+/g) || []
+    ).filter((token) => token.length > 1 && !stopWords.has(token));
+
+    // Postings are stored as [idDelta, weight, idDelta, weight, ...]
+    const addPostings = (postings, scores) => {
+        let id = 0;
+        for (let i = 0; i < postings.length; i += 2) {
+            id += postings[i];
+            scores.set(id, (scores.get(id) || 0) + postings[i + 1]);
+        }
+    };
+
+    async function search(query) {
+        const meta = await load('meta.json');
+        if (!meta) return [];
+
+        const tokens = tokenize(query, new Set(meta.stop_words));
+        if (!tokens.length) return [];
+
+        const shards = await Promise.all(tokens.map((token) => {
+            const prefix = token.slice(0, meta.prefix_len);
+            return meta.shards.includes(prefix) ? load(`terms-${prefix}.json`) : null;
+        }));
+
+        // Every word must match; the last one also matches as a prefix (type-ahead)
+        let scores = null;
+        tokens.forEach((token, i) => {
+            const matches = new Map();
+            const shard = shards[i] || {};
+            const isLast = i === tokens.length - 1;
+            for (const term of Object.keys(shard)) {
+                if (term === token || (isLast && term.startsWith(token))) addPostings(shard[term], matches);
+            }
+            if (scores === null) {
+                scores = matches;
+                return;
+            }
+            for (const [id, score] of scores) {
+                if (matches.has(id)) scores.set(id, score + matches.get(id));
+                else scores.delete(id);
+            }
+        });
+
+        const top = [...scores].sort((a, b) => b[1] - a[1] || a[0] - b[0]).slice(0, MAX_RESULTS);
+        const blocks = await Promise.all(top.map(([id]) => load(`docs-${Math.floor(id / meta.docs_per_shard)}.json`)));
+        return top.map(([id], i) => blocks[i] && blocks[i][id]).filter(Boolean);
+    }
+
+    function render(docs, query) {
+        results.replaceChildren();
+        if (!query.trim()) return;
+
+        if (!docs.length) {
+            const empty = document.createElement('li');
+            empty.className = 'blog-search-empty';
+            empty.textContent = 'No matching articles.';
+            results.append(empty);
+            return;
+        }
+
+        for (const [title, url, date, category] of docs) {
+            const item = document.createElement('li');
+            const link = document.createElement('a');
+            const meta = document.createElement('small');
+            link.href = new URL(url, siteRoot).href;
+            link.textContent = title;
+            meta.textContent = [date, category].filter(Boolean).join(' • ');
+            link.append(meta);
+            item.append(link);
+            results.append(item);
+        }
+    }
+
+    let timer = null;
+    let latest = 0;
+    input.addEventListener('input', () => {
+        clearTimeout(timer);
+        timer = setTimeout(async () => {
+            const query = input.value;
+            const ticket = ++latest;
+            const docs = await search(query);
+            if (ticket === latest) render(docs, query);
+        }, DEBOUNCE_MS);
+    });
+
+    form.addEventListener('submit', (event) => {
+        event.preventDefault();
+        const first = results.querySelector('a');
+        if (first) window.location.href = first.href;
+    });
+
+    document.addEventListener('keydown', (event) => {
+        if (event.key === 'Escape') results.replaceChildren();
+    });
+})();
@@ -0,0 +1,284 @@
+"""
+Metrics
+Minimal thread-safe counters and histograms for the Flask server, shaped
+after Prometheus (names, label sets, cumulative buckets) and exposed in its
+text format without a client library.
+
+    STRIPE_LATENCY = Histogram('stripe_request_seconds', 'Stripe API latency', ('method', 'path'))
+    STRIPE_LATENCY.labels('POST', '/v1/checkout/sessions').observe(0.23)
+    render(snapshot())  # -> text for a /metrics endpoint
+
+Recording is a dict lookup and a short lock, cheap enough to leave on.
+
+Each process counts on its own. Under several worker processes, give them a
+shared ProcessSnapshots directory: each worker saves its numbers there every
+few seconds and the worker answering /metrics merges them all.
+"""
+
+import os
+import glob
+import json
+import time
+import bisect
+import threading
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+REGISTRY = []  # Every metric, in creation order
+
+
+class Metric:
+    kind = None
+
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self.lock = threading.Lock()
+        self.children = {}  # label values -> child
+        REGISTRY.append(self)
+
+    def labels(self, *values):
+        values = tuple(str(v) for v in values)
+        if len(values) != len(self.labelnames):
+            raise ValueError(f"{self.name} takes labels {self.labelnames}, got {values}")
+        child = self.children.get(values)
+        if child is None:
+            with self.lock:
+                child = self.children.setdefault(values, self._new_child())
+        return child
+
+    def samples(self):
+        """[(label values, child)] sorted by label values."""
+        with self.lock:
+            return sorted(self.children.items())
+
+
+class _CounterChild:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.value = 0
+
+    def inc(self, amount=1):
+        with self.lock:
+            self.value += amount
+
+
+class Counter(Metric):
+    """Monotonic count, e.g. requests or bytes sent."""
+    kind = 'counter'
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount=1):
+        self.labels().inc(amount)
+
+
+class _HistogramChild:
+    def __init__(self, buckets):
+        self.lock = threading.Lock()
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # Last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        with self.lock:
+            self.counts[bisect.bisect_left(self.buckets, value)] += 1
+            self.sum += value
+            self.count += 1
+
+    def state(self):
+        """[per-bucket counts incl. +Inf, sum, count]"""
+        with self.lock:
+            return [list(self.counts), self.sum, self.count]
+
+    def snapshot(self):
+        """(cumulative bucket counts incl. +Inf, sum, count)"""
+        counts, total, count = self.state()
+        return cumulative_counts(counts), total, count
+
+    def quantile(self, q):
+        """Upper bound of the bucket holding the q-quantile (None if empty)."""
+        cumulative, _, count = self.snapshot()
+        if not count:
+            return None
+        rank = q * count
+        for bound, seen in zip(self.buckets + (float('inf'),), cumulative):
+            if seen >= rank:
+                return bound
+
+
+class Histogram(Metric):
+    """Distribution of observed values (latencies) in fixed buckets."""
+    kind = 'histogram'
+
+    def __init__(self, name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, help_text, labelnames)
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value):
+        self.labels().observe(value)
+
+
+def cumulative_counts(counts):
+    cumulative, running = [], 0
+    for c in counts:
+        running += c
+        cumulative.append(running)
+    return cumulative
+
+
+def snapshot(registry=None):
+    """This process's metrics as plain, JSON-serialisable data:
+    {name: {'kind', 'help', 'labelnames', 'buckets', 'samples': {labels json: value}}}"""
+    families = {}
+    for metric in REGISTRY if registry is None else registry:
+        samples = {}
+        for values, child in metric.samples():
+            samples[json.dumps(values)] = child.state() if metric.kind == 'histogram' else child.value
+        families[metric.name] = {
+            'kind': metric.kind,
+            'help': metric.help,
+            'labelnames': list(metric.labelnames),
+            'buckets': list(getattr(metric, 'buckets', ())),
+            'samples': samples,
+        }
+    return families
+
+
+def merge(snapshots):
+    """Sum several snapshots (one per process) into one"""
+    merged = {}
+    for families in snapshots:
+        for name, family in families.items():
+            into = merged.setdefault(name, dict(family, samples={}))
+            for key, value in family['samples'].items():
+                have = into['samples'].get(key)
+                if have is None:
+                    into['samples'][key] = value
+                elif family['kind'] == 'histogram':
+                    into['samples'][key] = [[a + b for a, b in zip(have[0], value[0])], have[1] + value[1], have[2] + value[2]]
+                else:
+                    into['samples'][key] = have + value
+    return merged
+
+
+def escape_label(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def label_text(names, values):
+    if not names:
+        return ''
+    return '{' + ','.join(f'{n}="{escape_label(v)}"' for n, v in zip(names, values)) + '}'
+
+
+def number_text(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(value)
+
+
+def render(families):
+    """Prometheus text exposition format (version 0.0.4)"""
+    lines = []
+    for name, family in families.items():
+        help_text = family['help'].replace('\\', '\\\\').replace('\n', '\\n')
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} {family["kind"]}')
+        labelnames = family['labelnames']
+        for key, value in sorted(family['samples'].items()):
+            values = json.loads(key)
+            if family['kind'] != 'histogram':
+                lines.append(f'{name}{label_text(labelnames, values)} {number_text(value)}')
+                continue
+            counts, total, count = value
+            bounds = family['buckets'] + [float('inf')]
+            for bound, seen in zip(bounds, cumulative_counts(counts)):
+                labels = label_text(labelnames + ['le'], values + [number_text(float(bound))])
+                lines.append(f'{name}_bucket{labels} {seen}')
+            lines.append(f'{name}_sum{label_text(labelnames, values)} {number_text(total)}')
+            lines.append(f'{name}_count{label_text(labelnames, values)} {count}')
+    return '\n'.join(lines) + '\n'
+
+
+class ProcessSnapshots:
+    """Per-process snapshot files in a directory shared by the workers.
+
+    save() writes this process's file at most every `interval` seconds (and
+    is called after requests); merged() adds up every file. When a worker
+    exits, retire(pid) folds its file into `retired.json`, so counters never
+    go backwards while workers come and go."""
+
+    RETIRED = 'retired'
+
+    def __init__(self, directory, interval=5.0):
+        self.directory = directory
+        self.interval = interval
+        self.saved_at = None
+        self.trailing = None  # Timer for a save deferred by the interval
+        self.lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, name):
+        return os.path.join(self.directory, f'{name}.json')
+
+    def save(self, force=False):
+        with self.lock:
+            now = time.monotonic()
+            wait = 0 if force or self.saved_at is None else self.saved_at + self.interval - now
+            if wait > 0:
+                # Saved recently: save again once the interval is up, so the
+                # last requests before a quiet spell are not left out
+                if self.trailing is None:
+                    self.trailing = threading.Timer(wait, self._save_trailing)
+                    self.trailing.daemon = True
+                    self.trailing.start()
+                return
+            self.saved_at = now
+            write_json(self.path(os.getpid()), snapshot())
+
+    def _save_trailing(self):
+        with self.lock:
+            self.trailing = None
+        self.save(force=True)
+
+    def merged(self):
+        """Every process's metrics summed, this one's up to date"""
+        self.save(force=True)
+        return merge(read_json(path) for path in glob.glob(os.path.join(self.directory, '*.json')))
+
+    def retire(self, pid):
+        """Fold an exited process's file into the retired totals (call from one process only)"""
+        path = self.path(pid)
+        if not os.path.exists(path):
+            return
+        retired = self.path(self.RETIRED)
+        totals = read_json(retired) if os.path.exists(retired) else {}
+        write_json(retired, merge([totals, read_json(path)]))
+        os.remove(path)
+
+    def clear(self):
+        for path in glob.glob(os.path.join(self.directory, '*.json')):
+            os.remove(path)
+
+
+def write_json(path, data):
+    # Write then rename, so a reader never sees half a file
+    temp = f'{path}.{os.getpid()}.tmp'
+    with open(temp, 'w', encoding='utf-8') as f:
+        json.dump(data, f)
+    os.replace(temp, path)
+
+
+def read_json(path):
+    try:
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}  # Removed or replaced while listing
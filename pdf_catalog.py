@@ -0,0 +1,134 @@
+"""
+PDF Catalog
+What is in the protected PDF folder, kept in memory so the /access page and
+downloads never list or read the directory per request:
+
+    {'name', 'size', 'size_label', 'pages', 'sha256', 'mtime', 'etag'}
+
+The catalog is built once and refreshed only when something changed: the
+folder's mtime moved (a file was added, removed or renamed) or, on Linux, an
+inotify event arrived (a file was rewritten in place). Unchanged files keep
+their entry, so a refresh only re-reads the PDFs that changed.
+"""
+
+import os
+import re
+import hashlib
+import threading
+
+import fs_watch
+
+PAGE_RE = re.compile(rb'/Type\s*/Page(?![A-Za-z])')
+PAGE_COUNT_RE = re.compile(rb'/Type\s*/Pages\b[^>]*?/Count\s+(\d+)|/Count\s+(\d+)[^>]*?/Type\s*/Pages\b', re.S)
+
+
+def pdf_page_count(data):
+    """Page count from the raw PDF bytes, or None if it cannot be told."""
+    pages = len(PAGE_RE.findall(data))
+    if pages:
+        return pages
+    # Page objects inside compressed object streams are invisible to the
+    # regex above; the page tree root still states the total
+    counts = [int(a or b) for a, b in PAGE_COUNT_RE.findall(data)]
+    return max(counts) if counts else None
+
+
+def pdf_entry(path):
+    with open(path, 'rb') as f:
+        data = f.read()
+        st = os.fstat(f.fileno())
+    sha256 = hashlib.sha256(data).hexdigest()
+    return {
+        'name': os.path.basename(path),
+        'size': st.st_size,
+        'size_label': format_size(st.st_size),
+        'pages': pdf_page_count(data),
+        'sha256': sha256,
+        'mtime': st.st_mtime,
+        'mtime_ns': st.st_mtime_ns,
+        'etag': sha256[:32],  # Strong: derived from the content itself
+    }
+
+
+def format_size(size):
+    for unit in ('bytes', 'KB', 'MB'):
+        if size < 1024 or unit == 'MB':
+            return f"{size:.0f} {unit}" if unit == 'bytes' else f"{size:.1f} {unit}"
+        size /= 1024
+
+
+class PdfCatalog:
+    """In-memory listing of the PDFs in `folder`."""
+
+    def __init__(self, folder):
+        self.folder = folder
+        self.lock = threading.Lock()
+        self.entries = {}
+        self.folder_mtime = None
+        self.watcher = None
+        self.watcher_pid = None
+        self.refresh()
+
+    def _watch(self):
+        # An inotify descriptor is shared with forked children (gunicorn
+        # --preload), where events would go to whichever process reads first
+        if self.watcher_pid != os.getpid():
+            self.watcher = fs_watch.DirectoryWatcher({self.folder})
+            self.watcher_pid = os.getpid()
+            if self.watcher.backend != 'inotify':
+                self.watcher.close()
+                self.watcher = None
+        return self.watcher
+
+    def _folder_mtime(self):
+        try:
+            return os.stat(self.folder).st_mtime_ns
+        except OSError:
+            return None
+
+    def _changed(self):
+        watcher = self._watch()
+        # Folder mtime catches added/removed files; inotify also sees in-place edits
+        changed = self._folder_mtime() != self.folder_mtime
+        if watcher is not None and watcher.changes(0):
+            changed = True
+        return changed
+
+    def refresh(self):
+        """Re-read whatever changed since the last refresh."""
+        with self.lock:
+            if self.watcher is not None and not self.watcher.watches:
+                self.watcher.close()  # Folder did not exist yet; watch it now
+                self.watcher_pid = None
+            self._watch()
+            self.folder_mtime = self._folder_mtime()
+            try:
+                names = sorted(n for n in os.listdir(self.folder) if n.endswith('.pdf'))
+            except OSError:
+                names = []
+
+            entries = {}
+            for name in names:
+                path = os.path.join(self.folder, name)
+                try:
+                    st = os.stat(path)
+                    old = self.entries.get(name)
+                    if old and old['mtime_ns'] == st.st_mtime_ns and old['size'] == st.st_size:
+                        entries[name] = old
+                    else:
+                        entries[name] = pdf_entry(path)
+                except OSError:
+                    continue  # Removed while we looked
+            self.entries = entries
+
+    def _current(self):
+        if self._changed():
+            self.refresh()
+        return self.entries
+
+    def all(self):
+        """Every PDF, sorted by name."""
+        return list(self._current().values())
+
+    def get(self, name):
+        return self._current().get(name)
@@ -0,0 +1,82 @@
+"""
+Process-Local Resources
+What must not cross a fork (gunicorn preloads the app, then forks workers)
+and is therefore created again in each process, on first use:
+
+- LocalConnections: one sqlite3 connection per thread per process, in WAL
+  mode.
+- BackgroundThreads: daemon threads started once per process by
+  ensure_started(), and stopped (and joined) by stop().
+"""
+
+import os
+import sqlite3
+import threading
+
+
+class LocalConnections:
+    """Per-thread, per-process sqlite3 connections to one database. The
+    parent directory and `schema` statements are created up front.
+
+    synchronous: NORMAL is safe with WAL (fsyncs at checkpoints); FULL for
+    data that must survive a crash once acknowledged; OFF where a lost
+    write costs nothing. autocommit: no implicit transactions; the caller
+    issues BEGIN where it needs one."""
+
+    def __init__(self, path, schema=(), synchronous='NORMAL', autocommit=False):
+        self.path = path
+        self.synchronous = synchronous
+        self.autocommit = autocommit
+        self.local = threading.local()
+        parent = os.path.dirname(path)
+        if parent:
+            os.makedirs(parent, exist_ok=True)
+        conn = self.get()
+        for statement in schema:
+            conn.execute(statement)
+
+    def get(self):
+        conn = getattr(self.local, 'conn', None)
+        if conn is None or self.local.pid != os.getpid():
+            options = {'isolation_level': None} if self.autocommit else {}
+            conn = sqlite3.connect(self.path, timeout=10, **options)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(f"PRAGMA synchronous={self.synchronous}")
+            self.local.conn, self.local.pid = conn, os.getpid()
+        return conn
+
+
+class BackgroundThreads:
+    """Daemon threads running `target` (one per name), started at most once
+    per process. `target` should return soon after `stopping` is set; `wake`
+    is called on stop() to interrupt whatever the threads wait on."""
+
+    def __init__(self, target, names, wake=None):
+        self.target = target
+        self.names = list(names)
+        self.wake = wake
+        self.stopping = threading.Event()
+        self.threads = []
+        self.started_pid = None
+        self.start_lock = threading.Lock()
+
+    def ensure_started(self):
+        """Start the threads in this process (again after a fork)."""
+        if self.started_pid == os.getpid():
+            return
+        with self.start_lock:
+            if self.started_pid == os.getpid():
+                return
+            self.stopping.clear()
+            self.threads = [threading.Thread(target=self.target, name=name, daemon=True) for name in self.names]
+            for thread in self.threads:
+                thread.start()
+            self.started_pid = os.getpid()
+
+    def stop(self, timeout=10):
+        self.stopping.set()
+        if self.wake is not None:
+            self.wake()
+        for thread in self.threads:
+            thread.join(timeout)
+        self.started_pid = None
@@ -0,0 +1,227 @@
+"""
+Publishing Helpers
+What goes on the web server and how it is shrunk on the way:
+
+- publishable_files(): every file under the site root that is part of the
+  public website (no sources, templates, secrets, Python or the paid PDFs).
+  `python deploy.py --list` prints it.
+- minify_html() / minify_css(): conservative minifiers. Whitespace inside
+  <pre>, <textarea>, <script> and quoted attribute values is left alone,
+  and scripts are never rewritten.
+- precompress_tree(): writes .gz and .br siblings (maximum compression) of
+  text files so stripe_server.py can send them without compressing per request.
+  What each file was compressed from (its mtime/size, whether minified, which
+  siblings were worth keeping) is recorded in PRECOMPRESS_MANIFEST, so a run
+  with nothing changed does no work, and siblings whose source is gone (a
+  removed listing page, say) are deleted. They are build output, ignored by
+  git like .build_cache/: each machine that serves the site makes its own.
+
+Brotli is optional (pip install brotli); without it only .gz files are written.
+"""
+
+import os
+import re
+import gzip
+import json
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Never published: sources, build state, secrets, tooling, and the PDFs that
+# are sold (Resources/protected_pdfs, the toolkit; also PDF_FOLDER if set)
+PUBLISH_EXCLUDE_DIRS = {
+    '.git', '.github', '.agent', '.vscode', '.ssh', '.build_cache', '.data', '__pycache__',
+    '.pytest_cache', '.mypy_cache', '.ruff_cache', '.venv', 'venv',
+    '_posts', 'templates', 'benchmarks', 'node_modules', 'Resources', 'The Confident Leader Toolkit',
+}
+PUBLISH_EXCLUDE_FILES = {
+    'requests.jsonl', 'git_status.txt', 'requirements.txt', '.gitignore',
+    'package.json', 'package-lock.json', 'pnpm-lock.yaml', 'tsconfig.json',
+}
+PUBLISH_EXCLUDE_EXTENSIONS = (
+    '.py', '.pyc', '.md', '.pub', '.code-workspace', '.tmp', '.backup', '.ts', '.tsx',
+)
+PUBLISH_EXCLUDE_PREFIXES = ('.env',)
+
+PRECOMPRESS_EXTENSIONS = ('.html', '.css', '.js', '.json', '.svg', '.xml', '.txt')
+PRECOMPRESS_MIN_SIZE = 1024  # Below this, compression saves less than a packet
+PRECOMPRESS_MANIFEST = os.path.join('.build_cache', 'precompress.json')
+PRECOMPRESSED_SUFFIXES = ('.gz', '.br')
+
+HTML_RAW_RE = re.compile(r'(<!--.*?-->|<(pre|textarea|script|style)\b[^>]*>.*?</\2\s*>)', re.S | re.I)
+# A '>' inside a quoted attribute value does not end the tag
+HTML_TAG_RE = re.compile(r'(<(?=[A-Za-z/!?])(?:"[^"]*"|\'[^\']*\'|[^\'">])*>)')
+TAG_SPACE_RE = re.compile(r'("[^"]*"|\'[^\']*\')|\s+(>)|\s+')
+SPACE_RE = re.compile(r'\s+')
+# One pass over CSS: strings (kept) | comments | last ';' in a block |
+# space around punctuation | space after ':' | any other whitespace run
+CSS_TOKEN_RE = re.compile(
+    r'("(?:\\.|[^"\\])*"|\'(?:\\.|[^\'\\])*\')|(/\*.*?\*/\s*)|(\s*;\s*(?=\}))|\s*([{};,>])\s*|(:)\s+|\s+',
+    re.S,
+)
+
+
+def publishable_files(root='.'):
+    """Site-relative paths (with '/') of every publishable file, sorted."""
+    pdf_folder = os.environ.get('PDF_FOLDER')  # stripe_server.py's, wherever it points
+    private = os.path.realpath(pdf_folder) if pdf_folder else None
+    paths = []
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = sorted(d for d in dirnames if d not in PUBLISH_EXCLUDE_DIRS
+                             and os.path.realpath(os.path.join(dirpath, d)) != private)
+        for name in sorted(filenames):
+            if (name in PUBLISH_EXCLUDE_FILES or name.endswith(PUBLISH_EXCLUDE_EXTENSIONS)
+                    or name.startswith(PUBLISH_EXCLUDE_PREFIXES)):
+                continue
+            paths.append(os.path.relpath(os.path.join(dirpath, name), root).replace(os.sep, '/'))
+    return paths
+
+
+def _collapse(text):
+    # Whitespace runs become one newline (if they had one) or one space
+    return SPACE_RE.sub(lambda m: '\n' if '\n' in m.group(0) else ' ', text)
+
+
+def minify_css(css):
+    def token(match):
+        string, comment, last_semicolon, punct, colon = match.groups()
+        if string:
+            return string
+        if comment or last_semicolon:
+            return ''
+        return punct or colon or ' '
+
+    return CSS_TOKEN_RE.sub(token, css).strip()
+
+
+def minify_html(markup):
+    out = []
+    pos = 0
+    for match in HTML_RAW_RE.finditer(markup):
+        out.append(_minify_html_flow(markup[pos:match.start()]))
+        block, tag = match.group(1), (match.group(2) or '').lower()
+        if block.startswith('<!--'):
+            if block.startswith('<!--[if'):
+                out.append(block)  # Conditional comments carry markup
+        elif tag == 'style':
+            open_end = block.index('>') + 1
+            close_start = block.lower().rindex('</style')
+            out.append(_minify_tag(block[:open_end]) + minify_css(block[open_end:close_start]) + block[close_start:])
+        else:
+            out.append(block)
+        pos = match.end()
+    out.append(_minify_html_flow(markup[pos:]))
+    return ''.join(out).strip() + '\n'
+
+
+def _minify_tag(tag):
+    # Quoted values are kept as they are; only the space between attributes shrinks
+    return TAG_SPACE_RE.sub(lambda m: m.group(1) or m.group(2) or ' ', tag)
+
+
+def _minify_html_flow(fragment):
+    parts = HTML_TAG_RE.split(fragment)
+    for i, part in enumerate(parts):
+        parts[i] = _minify_tag(part) if i % 2 else _collapse(part)
+    return ''.join(parts)
+
+
+def _encoders():
+    encoders = [('.gz', lambda d: gzip.compress(d, compresslevel=9, mtime=0))]
+    if brotli is not None:
+        encoders.append(('.br', lambda d: brotli.compress(d, quality=11)))
+    return encoders
+
+
+def precompress_file(path, data=None):
+    """Write .gz/.br siblings of `path` (from `data` if given, e.g. a minified
+    copy). Siblings that would not be smaller are not kept. Returns
+    (sibling files (re)written, suffixes kept)."""
+    if data is None:
+        with open(path, 'rb') as f:
+            data = f.read()
+
+    written = 0
+    kept = []
+    for suffix, encode in _encoders():
+        target = path + suffix
+        compressed = encode(data)
+        if len(compressed) >= len(data):
+            if os.path.exists(target):
+                os.remove(target)
+            continue
+        kept.append(suffix)
+        try:
+            with open(target, 'rb') as f:
+                if f.read() == compressed:
+                    os.utime(target)  # Mark as built from the current source
+                    continue
+        except FileNotFoundError:
+            pass
+        with open(target + '.tmp', 'wb') as f:
+            f.write(compressed)
+        os.replace(target + '.tmp', target)
+        written += 1
+    return written, kept
+
+
+def _load_precompressed(path):
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {}
+
+
+def precompress_tree(root='.', minify=False):
+    """Precompress every publishable text file under `root`. With `minify`,
+    the compressed copies of HTML/CSS carry minified bytes (the source files
+    themselves are never modified here). Siblings left over from a file that
+    is gone, or that no longer gets them, are deleted. Returns (files,
+    siblings written, siblings removed)."""
+    manifest_path = os.path.join(root, PRECOMPRESS_MANIFEST)
+    known = _load_precompressed(manifest_path)
+    encodings = [suffix for suffix, _ in _encoders()]
+    state = {}
+    files = written = removed = 0
+    siblings = []
+    for rel_path in publishable_files(root):
+        path = os.path.join(root, rel_path)
+        if rel_path.endswith(PRECOMPRESSED_SUFFIXES):
+            siblings.append(rel_path)
+            continue
+        if not rel_path.endswith(PRECOMPRESS_EXTENSIONS) or os.path.getsize(path) < PRECOMPRESS_MIN_SIZE:
+            continue
+        files += 1
+        minified = minify and rel_path.endswith(('.html', '.css'))
+        st = os.stat(path)
+        source = {'mtime_ns': st.st_mtime_ns, 'size': st.st_size, 'minified': minified, 'encodings': encodings}
+        entry = known.get(rel_path)
+        if (entry and entry['source'] == source
+                and all(os.path.exists(path + suffix) for suffix in entry['kept'])):
+            state[rel_path] = entry
+            continue
+
+        data = None
+        if minified:
+            with open(path, 'r', encoding='utf-8') as f:
+                text = f.read()
+            data = (minify_html(text) if rel_path.endswith('.html') else minify_css(text)).encode('utf-8')
+        count, kept = precompress_file(path, data)
+        written += count
+        state[rel_path] = {'source': source, 'kept': kept}
+
+    for rel_path in siblings:
+        source, suffix = rel_path[:-3], rel_path[-3:]
+        if source.endswith(PRECOMPRESS_EXTENSIONS) and suffix not in state.get(source, {}).get('kept', ()):
+            os.remove(os.path.join(root, rel_path))
+            removed += 1
+
+    if state != known:
+        os.makedirs(os.path.dirname(manifest_path), exist_ok=True)
+        with open(manifest_path + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump(state, f, indent=1, sort_keys=True)
+        os.replace(manifest_path + '.tmp', manifest_path)
+    return files, written, removed
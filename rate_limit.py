@@ -0,0 +1,145 @@
+"""
+Rate Limiting
+Token buckets that keep /login from being used to guess access tokens and
+/create-checkout-session from spending Stripe API calls without end.
+
+A RateLimit allows `requests` per `seconds` for one key (the client IP, or
+the email being tried): each key has a bucket of that many tokens, refilled
+steadily, and every request takes one. An empty bucket means 429 with a
+Retry-After of the time until the next token.
+
+Two backends share one interface, take(key, limit) -> seconds to wait (0 = go):
+- MemoryBuckets (default): per process, an LRU of at most `max_keys`
+  buckets. An evicted bucket starts again full, so memory stays bounded
+  whatever keys an attacker makes up.
+- SQLiteBuckets: one table shared by every worker process, so N workers
+  do not mean N times the limit. Buckets that have refilled are pruned.
+
+stripe_server.py picks one from the environment:
+  RATE_LIMIT_STORE=memory|sqlite|off   (default memory)
+  RATE_LIMIT_DB_PATH=/path/to.db       (default .data/rate_limits.db next to this file)
+"""
+
+import os
+import time
+import threading
+from collections import OrderedDict, namedtuple
+
+from metrics import Counter
+from process_local import LocalConnections
+
+DEFAULT_DB_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.data', 'rate_limits.db')
+DEFAULT_MAX_KEYS = 100000
+PRUNE_INTERVAL = 60  # Seconds between deletes of refilled SQLite buckets (per process)
+
+RATE_LIMITED = Counter('rate_limited_requests_total', 'Requests refused with 429, by limit', ('limit',))
+
+# `key` names what the bucket is kept per: 'ip' or 'email'
+RateLimit = namedtuple('RateLimit', 'name key requests seconds')
+
+
+def refill(tokens, updated, now, limit):
+    """(tokens left, seconds to wait): one token taken if there was one"""
+    rate = limit.requests / limit.seconds
+    tokens = min(limit.requests, tokens + max(0.0, now - updated) * rate)
+    if tokens >= 1:
+        return tokens - 1, 0.0
+    return tokens, (1 - tokens) / rate
+
+
+class MemoryBuckets:
+    """Per-process buckets in a size-bounded LRU."""
+
+    def __init__(self, max_keys=DEFAULT_MAX_KEYS):
+        self.max_keys = max_keys
+        self.lock = threading.Lock()
+        self.buckets = OrderedDict()  # key -> (tokens, updated)
+
+    def take(self, key, limit):
+        now = time.monotonic()
+        with self.lock:
+            tokens, updated = self.buckets.pop(key, (limit.requests, now))
+            tokens, wait = refill(tokens, updated, now, limit)
+            self.buckets[key] = (tokens, now)
+            if len(self.buckets) > self.max_keys:
+                self.buckets.popitem(last=False)
+        return wait
+
+    def stats(self):
+        with self.lock:
+            return {'backend': 'memory', 'keys': len(self.buckets)}
+
+
+class SQLiteBuckets:
+    """Buckets shared by every worker process, in SQLite (WAL mode). A lost
+    update costs at most a token, so writes are not fsynced."""
+
+    SCHEMA = (
+        """CREATE TABLE IF NOT EXISTS rate_buckets (
+            key TEXT PRIMARY KEY,
+            tokens REAL NOT NULL,
+            updated REAL NOT NULL,
+            full_at REAL NOT NULL
+        )""",
+        "CREATE INDEX IF NOT EXISTS rate_buckets_full_idx ON rate_buckets (full_at)",
+    )
+    GET_SQL = "SELECT tokens, updated FROM rate_buckets WHERE key = ?"
+    PUT_SQL = "INSERT OR REPLACE INTO rate_buckets (key, tokens, updated, full_at) VALUES (?, ?, ?, ?)"
+    # A bucket that has refilled is the same as no bucket
+    PRUNE_SQL = "DELETE FROM rate_buckets WHERE full_at < ?"
+    COUNT_SQL = "SELECT COUNT(*) FROM rate_buckets"
+
+    def __init__(self, path=DEFAULT_DB_PATH):
+        self.path = path
+        self.last_prune = 0.0
+        # Autocommit mode; take() opens its own write transaction
+        self.connections = LocalConnections(path, self.SCHEMA, synchronous='OFF', autocommit=True)
+
+    def connection(self):
+        return self.connections.get()
+
+    def take(self, key, limit):
+        now = time.time()  # Wall clock: shared between processes
+        conn = self.connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(self.GET_SQL, (key,)).fetchone()
+            tokens, wait = refill(*(row or (limit.requests, now)), now, limit)
+            full_at = now + (limit.requests - tokens) * limit.seconds / limit.requests
+            conn.execute(self.PUT_SQL, (key, tokens, now, full_at))
+            if now - self.last_prune > PRUNE_INTERVAL:
+                self.last_prune = now
+                conn.execute(self.PRUNE_SQL, (now,))
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return wait
+
+    def stats(self):
+        return {'backend': 'sqlite', 'keys': self.connection().execute(self.COUNT_SQL).fetchone()[0]}
+
+
+def open_buckets(kind='memory', path=None):
+    """MemoryBuckets or SQLiteBuckets (at `path`), by name."""
+    if kind == 'memory':
+        return MemoryBuckets()
+    if kind == 'sqlite':
+        return SQLiteBuckets(path or DEFAULT_DB_PATH)
+    raise ValueError(f"Unknown RATE_LIMIT_STORE {kind!r} (use 'memory', 'sqlite' or 'off')")
+
+
+def retry_after(buckets, limits, keys):
+    """Take a token from each limit's bucket for keys[limit.key] (limits with
+    no key value are skipped). Seconds until the request may be retried; 0 if
+    it may go ahead."""
+    wait = 0.0
+    for limit in limits:
+        value = keys.get(limit.key)
+        if not value:
+            continue
+        limit_wait = buckets.take(f'{limit.name}:{value}', limit)
+        if limit_wait:
+            RATE_LIMITED.labels(limit.name).inc()
+            wait = max(wait, limit_wait)
+    return wait
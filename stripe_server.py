@@ -1,77 +1,328 @@
 import os
+import re
 import json
+import time
+import hmac
+import base64
+import hashlib
+import mimetypes
 import secrets
+import threading
 from datetime import datetime, timedelta
-from flask import Flask, request, jsonify, render_template, redirect, url_for, session, send_from_directory
+from functools import partial
+from urllib.parse import quote
+from flask import Flask, Blueprint, Response, current_app, g, request, jsonify, render_template, redirect, url_for, session, send_from_directory, abort
 from flask_cors import CORS
 import stripe
 import stripe.checkout
-from dotenv import load_dotenv
+from werkzeug.security import safe_join
 
-# Load environment variables from .env file
-load_dotenv()
+from access_store import ExpirySweeper, open_access_store
+from file_delivery import send_file_ranges
+from pdf_catalog import PdfCatalog
+from webhook_queue import WebhookQueue
+from ttl_cache import TTLCache
+from stripe_client import configure_stripe, idempotency_key, STRIPE_LATENCY
+from metrics import Counter, Histogram, ProcessSnapshots, render, snapshot
+from rate_limit import RateLimit, open_buckets, retry_after
 
-app = Flask(__name__)
-app.secret_key = os.environ.get('FLASK_SECRET_KEY', secrets.token_hex(32))
-CORS(app)
+# Configuration
+ACCESS_DURATION_DAYS = 365  # How long access lasts after purchase
+DEFAULT_PDF_FOLDER = os.path.join(os.path.dirname(__file__), 'Resources', 'protected_pdfs')
+DEFAULT_WEBHOOK_QUEUE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.data', 'webhooks.db')
+WEBHOOK_EVENT_TYPES = {'checkout.session.completed'}  # Others are acknowledged and dropped
 
-# Stripe configuration
-stripe.api_key = os.environ.get('STRIPE_SECRET_KEY')
-STRIPE_PUBLISHABLE_KEY = os.environ.get('STRIPE_PUBLISHABLE_KEY')
-STRIPE_PRICE_ID = os.environ.get('STRIPE_PRICE_ID')  # Your Stripe Price ID
-STRIPE_WEBHOOK_SECRET = os.environ.get('STRIPE_WEBHOOK_SECRET')
+# Checkout sessions already turned into access, filled by /success and the
+# webhook workers, so a reload of /success makes no Stripe call. A miss
+# falls back to the (shared) access store before asking Stripe.
+FULFILLED_SESSION_TTL = 24 * 60 * 60
+SESSION_LOOKUPS = Counter(
+    'fulfilled_session_lookups_total', 'Checkout sessions looked up on /success, by where they were found', ('source',))
 
-# Debug: Print configuration status (remove in production)
-print("=" * 60)
-print("STRIPE CONFIGURATION STATUS:")
-print(f"Secret Key: {'✓ Loaded' if stripe.api_key else '✗ NOT FOUND'}")
-print(f"Publishable Key: {'✓ Loaded' if STRIPE_PUBLISHABLE_KEY else '✗ NOT FOUND'}")
-print(f"Price ID: {STRIPE_PRICE_ID if STRIPE_PRICE_ID else '✗ NOT FOUND'}")
-print("=" * 60)
+# Served on /metrics (Prometheus text format) with the Stripe client's and
+# the access store's metrics. Routes are labelled by their rule, e.g.
+# /download/<filename>, so every PDF shares one series.
+HTTP_REQUESTS = Counter('http_requests_total', 'Requests handled, by route, method and status', ('route', 'method', 'status'))
+HTTP_LATENCY = Histogram('http_request_seconds', 'Time to produce a response, by route', ('route', 'method'))
+PDF_BYTES = Counter('pdf_bytes_sent_total', 'Bytes of protected PDFs sent, by file', ('filename',))
 
-# Configuration
-DOMAIN = os.environ.get('DOMAIN', 'http://localhost:5000')
-PDF_FOLDER = os.path.join(os.path.dirname(__file__), 'Resources', 'protected_pdfs')
-ACCESS_DURATION_DAYS = 365  # How long access lasts after purchase
+DOWNLOAD_URL_TTL = 15 * 60  # Seconds a signed link stays valid
+
+# Token buckets per client IP and per email, checked before the view runs,
+# so a throttled request never reaches the access store or Stripe. Only the
+# methods listed are limited (GET /login is just the form).
+ROUTE_LIMITS = {
+    ('site.login', 'POST'): (
+        RateLimit('login_ip', 'ip', requests=10, seconds=60),
+        RateLimit('login_email', 'email', requests=5, seconds=15 * 60),
+    ),
+    ('site.create_checkout_session', 'POST'): (
+        RateLimit('checkout_ip', 'ip', requests=10, seconds=60),
+        RateLimit('checkout_email', 'email', requests=3, seconds=60),
+    ),
+}
+
+# Static files whose name carries a content hash (written by build_blog.py:
+# style.3f2a9c1b7e.css, images/responsive/hero-3f2a9c1b7e-960.webp) never
+# change, so browsers may cache them for a year without revalidating.
+FINGERPRINTED_RE = re.compile(r'(\.[0-9a-f]{10}\.|-[0-9a-f]{10}-\d+\.)[A-Za-z0-9]+$')
+IMMUTABLE_MAX_AGE = 365 * 24 * 60 * 60
+
+# .br/.gz siblings written by `build_blog.py --precompress`, preferred first.
+# They are sent as-is, so nothing is compressed per request.
+PRECOMPRESSED_ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+site = Blueprint('site', __name__)
+
+
+def load_config():
+    """Settings from the environment, after loading .env"""
+    from dotenv import load_dotenv
+    load_dotenv()
+
+    secret_key = os.environ.get('FLASK_SECRET_KEY') or secrets.token_hex(32)
+    if not (os.environ.get('DOWNLOAD_SIGNING_KEY') or os.environ.get('FLASK_SECRET_KEY')):
+        # The fallback secret is random per process: with several workers a link
+        # signed by one is rejected by the others (and every restart breaks links)
+        print("⚠️  Neither DOWNLOAD_SIGNING_KEY nor FLASK_SECRET_KEY is set: download links"
+              " only work in the worker process that signed them. Set one when running"
+              " more than one worker.")
+    return {
+        'SECRET_KEY': secret_key,
+        'STRIPE_SECRET_KEY': os.environ.get('STRIPE_SECRET_KEY'),
+        'STRIPE_PUBLISHABLE_KEY': os.environ.get('STRIPE_PUBLISHABLE_KEY'),
+        'STRIPE_PRICE_ID': os.environ.get('STRIPE_PRICE_ID'),  # Your Stripe Price ID
+        'STRIPE_WEBHOOK_SECRET': os.environ.get('STRIPE_WEBHOOK_SECRET'),
+        'DOMAIN': os.environ.get('DOMAIN', 'http://localhost:5000'),
+        'PDF_FOLDER': os.environ.get('PDF_FOLDER') or DEFAULT_PDF_FOLDER,
+
+        # Verified Stripe events are queued here and fulfilled by background workers
+        'WEBHOOK_QUEUE_PATH': os.environ.get('WEBHOOK_QUEUE_PATH') or DEFAULT_WEBHOOK_QUEUE_PATH,
+        'WEBHOOK_WORKERS': int(os.environ.get('WEBHOOK_WORKERS', '2')),
+
+        # Grants expired this many days ago are archived by a background sweep,
+        # and archived sessions deleted after the retention period
+        'ACCESS_SWEEP_INTERVAL': int(os.environ.get('ACCESS_SWEEP_INTERVAL', '3600')),
+        'ACCESS_SWEEP_GRACE_DAYS': int(os.environ.get('ACCESS_SWEEP_GRACE_DAYS', '30')),
+        'ACCESS_ARCHIVE_RETENTION_DAYS': int(os.environ.get('ACCESS_ARCHIVE_RETENTION_DAYS', '90')),
+
+        # Shared by worker processes so /metrics adds up all of them (see metrics.py)
+        'METRICS_DIR': os.environ.get('METRICS_DIR'),
+
+        # Download links on /access are signed (HMAC of filename + expiry), so a
+        # download is checked without touching the session or the access store.
+        # The key must be the same in every worker; it defaults to the Flask secret.
+        'DOWNLOAD_SIGNING_KEY': (os.environ.get('DOWNLOAD_SIGNING_KEY') or secret_key).encode('utf-8'),
+
+        # Optional hand-off of the file itself to the front-end web server:
+        #   DOWNLOAD_OFFLOAD=x-accel-redirect  nginx; DOWNLOAD_OFFLOAD_PREFIX is an `internal` location
+        #   DOWNLOAD_OFFLOAD=x-sendfile        Apache mod_xsendfile / lighttpd; sends the file path
+        'DOWNLOAD_OFFLOAD': os.environ.get('DOWNLOAD_OFFLOAD', '').lower(),
+        'DOWNLOAD_OFFLOAD_PREFIX': os.environ.get('DOWNLOAD_OFFLOAD_PREFIX', '/protected_pdfs/'),
+
+        # Rate limit buckets (see rate_limit.py): memory (per worker process),
+        # sqlite (shared by all workers) or off
+        'RATE_LIMIT_STORE': os.environ.get('RATE_LIMIT_STORE', 'memory').lower(),
+        'RATE_LIMIT_DB_PATH': os.environ.get('RATE_LIMIT_DB_PATH'),
+    }
+
+
+def create_app(**overrides):
+    """Build the Flask app. Cheap: stores, the PDF catalog and the webhook
+    queue are opened on first use, so this is safe to call before forking."""
+    app = Flask(__name__)
+    app.config.update(load_config())
+    app.config.update(overrides)
+    CORS(app)
+
+    # Pooled keep-alive client, timeouts and retries for every Stripe call
+    # (see stripe_client.py; STRIPE_API_BASE points it at a local stand-in)
+    stripe.api_key = app.config['STRIPE_SECRET_KEY']
+    configure_stripe()
+
+    app.extensions['stripe_server'] = Services(app.config)
+    app.register_blueprint(site)
+    return app
+
+
+class Services:
+    """The app's stores, caches and queue, each created on first use."""
+
+    def __init__(self, config):
+        self.config = config
+        self.lock = threading.RLock()  # Factories may use other services
+        self.created = {}
+
+    def _lazy(self, name, factory):
+        value = self.created.get(name)
+        if value is None:
+            with self.lock:
+                value = self.created.get(name)
+                if value is None:
+                    value = self.created[name] = factory()
+        return value
+
+    @property
+    def access_store(self):
+        # Purchases: SQLite by default, so they survive restarts and every worker
+        # process sees the same grants (see access_store.py for ACCESS_STORE / ACCESS_DB_PATH)
+        return self._lazy('access_store', open_access_store)
+
+    @property
+    def access_sweeper(self):
+        return self._lazy('access_sweeper', lambda: ExpirySweeper(
+            self.access_store, interval=self.config['ACCESS_SWEEP_INTERVAL'],
+            grace=timedelta(days=self.config['ACCESS_SWEEP_GRACE_DAYS']),
+            retention=timedelta(days=self.config['ACCESS_ARCHIVE_RETENTION_DAYS'])))
+
+    @property
+    def pdf_catalog(self):
+        # Size, page count and content hash of each protected PDF, kept in
+        # memory and refreshed only when the folder changes
+        return self._lazy('pdf_catalog', lambda: PdfCatalog(self.config['PDF_FOLDER']))
 
-# Simple in-memory storage (use a database in production)
-# Format: {email: {'access_token': token, 'expires': datetime, 'session_id': session_id}}
-user_access = {}
+    @property
+    def fulfilled_sessions(self):
+        return self._lazy('fulfilled_sessions', lambda: TTLCache(FULFILLED_SESSION_TTL))
 
+    @property
+    def webhook_queue(self):
+        return self._lazy('webhook_queue', lambda: WebhookQueue(
+            self.config['WEBHOOK_QUEUE_PATH'], partial(handle_webhook_event, self),
+            workers=self.config['WEBHOOK_WORKERS']))
 
-@app.route('/')
+    @property
+    def rate_buckets(self):
+        if self.config['RATE_LIMIT_STORE'] == 'off':
+            return None
+        return self._lazy('rate_buckets', lambda: open_buckets(
+            self.config['RATE_LIMIT_STORE'], self.config['RATE_LIMIT_DB_PATH']))
+
+    @property
+    def metrics_snapshots(self):
+        if not self.config['METRICS_DIR']:
+            return None
+        return self._lazy('metrics_snapshots', lambda: ProcessSnapshots(self.config['METRICS_DIR']))
+
+    def close(self):
+        """Stop the background threads this process started and save its metrics"""
+        for name in ('webhook_queue', 'access_sweeper'):
+            worker = self.created.get(name)
+            if worker is not None:
+                worker.stop()
+        snapshots = self.created.get('metrics_snapshots')
+        if snapshots is not None:
+            snapshots.save(force=True)
+
+
+def services():
+    return current_app.extensions['stripe_server']
+
+
+def print_config_status(app):
+    """Startup banner for the development server"""
+    print("=" * 60)
+    print("STRIPE CONFIGURATION STATUS:")
+    print(f"Secret Key: {'✓ Loaded' if app.config['STRIPE_SECRET_KEY'] else '✗ NOT FOUND'}")
+    print(f"Publishable Key: {'✓ Loaded' if app.config['STRIPE_PUBLISHABLE_KEY'] else '✗ NOT FOUND'}")
+    print(f"Price ID: {app.config['STRIPE_PRICE_ID'] if app.config['STRIPE_PRICE_ID'] else '✗ NOT FOUND'}")
+    print("=" * 60)
+
+
+@site.route('/')
 def index():
     """Home page with buy button"""
     return render_template('buy_button.html', 
-                         publishable_key=STRIPE_PUBLISHABLE_KEY,
-                         price_id=STRIPE_PRICE_ID)
+                         publishable_key=current_app.config['STRIPE_PUBLISHABLE_KEY'],
+                         price_id=current_app.config['STRIPE_PRICE_ID'])
 
-@app.route('/<path:filename>')
+@site.route('/<path:filename>')
 def serve_static(filename):
     """Serve static files from the root directory"""
-    return send_from_directory('.', filename)
+    # Dotfiles and dot-directories (.env, .git, .data/access.db) are private
+    if any(part.startswith('.') for part in filename.split('/')):
+        abort(404)
+    # So are the protected PDFs (the default PDF_FOLDER is inside the site
+    # root): they are only sent by /download, with a signed link
+    if in_pdf_folder(filename):
+        abort(404)
+
+    fingerprinted = FINGERPRINTED_RE.search(filename)
+    max_age = IMMUTABLE_MAX_AGE if fingerprinted else 0
+    encoding, variant, negotiated = precompressed_variant(filename)
+
+    if encoding:
+        # Same type as the original; the ETag is the variant's own
+        mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+        response = send_from_directory('.', variant, mimetype=mimetype, max_age=max_age)
+        response.headers['Content-Encoding'] = encoding
+    else:
+        response = send_from_directory('.', filename, max_age=max_age)
+    if negotiated:
+        response.vary.add('Accept-Encoding')
+
+    if fingerprinted:
+        response.cache_control.immutable = True
+    else:
+        # Everything else is revalidated on each use: the ETag makes that a
+        # 304 with no body when the file has not changed
+        response.cache_control.no_cache = True
+    return response
+
+
+def in_pdf_folder(filename):
+    """True if a static path resolves to PDF_FOLDER or anything under it"""
+    target = os.path.normcase(os.path.realpath(os.path.join(current_app.root_path, filename)))
+    folder = os.path.normcase(os.path.realpath(current_app.config['PDF_FOLDER']))
+    return target == folder or target.startswith(folder + os.sep)
+
 
+def precompressed_variant(filename):
+    """Pick the best precompressed sibling the client accepts.
+    Returns (encoding, sibling filename, whether any sibling exists)."""
+    path = safe_join(current_app.root_path, filename)
+    if path is None or not os.path.isfile(path):
+        return None, None, False
 
-@app.route('/create-checkout-session', methods=['POST'])
+    source_mtime = os.stat(path).st_mtime_ns
+    negotiated = False
+    for encoding, suffix in PRECOMPRESSED_ENCODINGS:
+        try:
+            # A sibling older than its source is stale, so it is ignored
+            fresh = os.stat(path + suffix).st_mtime_ns >= source_mtime
+        except OSError:
+            continue
+        negotiated = True
+        if fresh and request.accept_encodings[encoding]:
+            return encoding, filename + suffix, True
+    return None, None, negotiated
+
+
+@site.route('/create-checkout-session', methods=['POST'])
 def create_checkout_session():
     """Create a Stripe Checkout session"""
     try:
         data = request.get_json()
         email = data.get('email')
+        price_id = current_app.config['STRIPE_PRICE_ID']
+        domain = current_app.config['DOMAIN']
         
         checkout_session = stripe.checkout.Session.create(
             customer_email=email,
             payment_method_types=['card'],
             line_items=[{
-                'price': STRIPE_PRICE_ID,
+                'price': price_id,
                 'quantity': 1,
             }],
             mode='payment',
-            success_url=DOMAIN + '/success?session_id={CHECKOUT_SESSION_ID}',
-            cancel_url=DOMAIN + '/cancel',
+            success_url=domain + '/success?session_id={CHECKOUT_SESSION_ID}',
+            cancel_url=domain + '/cancel',
             metadata={
                 'customer_email': email
-            }
+            },
+            # Same buyer within the same minute (a double-clicked button, or
+            # a retry after a timeout) gets the same Checkout Session back
+            idempotency_key=idempotency_key('checkout', email, price_id, int(time.time() // 60))
         )
         
         return jsonify({'sessionId': checkout_session.id})
@@ -86,54 +337,79 @@ def create_checkout_session():
         return jsonify({'error': str(e)}), 403
 
 
-@app.route('/success')
+@site.route('/success')
 def success():
     """Success page after payment"""
     session_id = request.args.get('session_id')
     
     if not session_id:
-        return redirect(url_for('index'))
+        return redirect(url_for('.index'))
     
     try:
-        # Retrieve the session from Stripe
-        checkout_session = stripe.checkout.Session.retrieve(session_id)
+        # Already fulfilled (a reload, or the webhook got there first)?
+        record = fulfilled_session(session_id)
         
-        if checkout_session.payment_status == 'paid':
-            email = checkout_session.customer_email
-            
-            # Generate access token
-            access_token = secrets.token_urlsafe(32)
-            expires = datetime.now() + timedelta(days=ACCESS_DURATION_DAYS)
+        if record is None:
+            # Retrieve the session from Stripe
+            SESSION_LOOKUPS.labels('stripe').inc()
+            checkout_session = stripe.checkout.Session.retrieve(session_id)
+            if checkout_session.payment_status != 'paid':
+                return redirect(url_for('.index'))
+            if outlived_access(checkout_session):
+                return render_template('expired.html')
             
             # Store user access
-            user_access[email] = {
-                'access_token': access_token,
-                'expires': expires,
-                'session_id': session_id
-            }
-            
-            # Set session
-            session['email'] = email
-            session['access_token'] = access_token
-            
-            return render_template('success.html', 
-                                 email=email,
-                                 access_token=access_token)
-        else:
-            return redirect(url_for('index'))
+            expires = datetime.now() + timedelta(days=ACCESS_DURATION_DAYS)
+            record = services().access_store.fulfil(checkout_session.customer_email, session_id, expires)
+            services().fulfilled_sessions.set(session_id, record)
+        
+        email = record['email']
+        access_token = record['access_token']
+        if access_token is None:
+            return render_template('expired.html')  # Archived: expired long ago
+        
+        # Set session
+        session['email'] = email
+        session['access_token'] = access_token
+        
+        return render_template('success.html', 
+                             email=email,
+                             access_token=access_token)
             
     except Exception as e:
         print(f"Error: {e}")
-        return redirect(url_for('index'))
+        return redirect(url_for('.index'))
+
 
+def outlived_access(checkout_session):
+    """True for a checkout older than the access it bought. Its grant has
+    expired, and may since have been archived and pruned, so it must not be
+    fulfilled again."""
+    created = checkout_session.get('created')
+    return created is not None and created < time.time() - ACCESS_DURATION_DAYS * 24 * 60 * 60
 
-@app.route('/cancel')
+
+def fulfilled_session(session_id):
+    """Access granted for a checkout session, if any, without calling Stripe"""
+    fulfilled_sessions = services().fulfilled_sessions
+    record = fulfilled_sessions.get(session_id)
+    if record is not None:
+        SESSION_LOOKUPS.labels('cache').inc()
+    else:
+        record = services().access_store.find_by_session(session_id)
+        if record is not None:
+            SESSION_LOOKUPS.labels('store').inc()
+            fulfilled_sessions.set(session_id, record)
+    return record
+
+
+@site.route('/cancel')
 def cancel():
     """Cancel page"""
     return render_template('cancel.html')
 
 
-@app.route('/access')
+@site.route('/access')
 def access_pdfs():
     """Access page for authenticated users"""
     email = session.get('email')
@@ -141,41 +417,44 @@ def access_pdfs():
     
     # Check if user is authenticated
     if not email or not access_token:
-        return redirect(url_for('login'))
+        return redirect(url_for('.login'))
     
     # Verify access token
-    user_data = user_access.get(email)
+    user_data = services().access_store.get(email)
     if not user_data or user_data['access_token'] != access_token:
-        return redirect(url_for('login'))
+        return redirect(url_for('.login'))
     
     # Check if access has expired
     if datetime.now() > user_data['expires']:
         return render_template('expired.html')
     
     # Get list of PDFs
-    pdf_files = []
-    if os.path.exists(PDF_FOLDER):
-        pdf_files = [f for f in os.listdir(PDF_FOLDER) if f.endswith('.pdf')]
+    pdf_files = services().pdf_catalog.all()
+
+    # Links never outlive the access itself
+    link_expires = min(int(time.time()) + DOWNLOAD_URL_TTL, int(user_data['expires'].timestamp()))
+    download_urls = {pdf['name']: signed_download_url(pdf['name'], link_expires) for pdf in pdf_files}
     
     return render_template('access.html', 
                          email=email,
                          pdf_files=pdf_files,
+                         download_urls=download_urls,
                          expires=user_data['expires'].strftime('%B %d, %Y'))
 
 
-@app.route('/login', methods=['GET', 'POST'])
+@site.route('/login', methods=['GET', 'POST'])
 def login():
     """Login page for returning customers"""
     if request.method == 'POST':
         email = request.form.get('email')
         access_token = request.form.get('access_token')
         
-        user_data = user_access.get(email)
+        user_data = services().access_store.get(email)
         if user_data and user_data['access_token'] == access_token:
             if datetime.now() <= user_data['expires']:
                 session['email'] = email
                 session['access_token'] = access_token
-                return redirect(url_for('access_pdfs'))
+                return redirect(url_for('.access_pdfs'))
             else:
                 return render_template('login.html', error='Your access has expired.')
         else:
@@ -184,9 +463,72 @@ def login():
     return render_template('login.html')
 
 
-@app.route('/download/<filename>')
+def download_signature(filename, expires):
+    """HMAC-SHA256 over the filename and expiry, URL-safe base64"""
+    message = f"{filename}\n{expires}".encode('utf-8')
+    digest = hmac.new(current_app.config['DOWNLOAD_SIGNING_KEY'], message, hashlib.sha256).digest()
+    return base64.urlsafe_b64encode(digest).rstrip(b'=').decode('ascii')
+
+
+def signed_download_url(filename, expires):
+    """Download link for `filename` that is valid until `expires` (unix time)"""
+    return url_for('.download_pdf', filename=filename, expires=expires, sig=download_signature(filename, expires))
+
+
+def valid_download_signature(filename, expires, signature):
+    """Constant-time check of a signed link; no session or store lookup"""
+    try:
+        expires = int(expires)
+    except (TypeError, ValueError):
+        return False
+    if expires < time.time():
+        return False
+    # As bytes: compare_digest() raises on non-ASCII str, and `sig` may be anything
+    expected = download_signature(filename, expires).encode('ascii')
+    return hmac.compare_digest(expected, (signature or '').encode('utf-8', 'surrogateescape'))
+
+
+def send_pdf(filename):
+    """Send a protected PDF, or let the front-end server send it"""
+    pdf = services().pdf_catalog.get(filename)
+    path = safe_join(current_app.config['PDF_FOLDER'], filename)
+    if pdf is None or path is None:
+        abort(404)
+    offload = current_app.config['DOWNLOAD_OFFLOAD']
+    if offload not in ('x-accel-redirect', 'x-sendfile'):
+        # Range / ETag aware; sent with sendfile() where the server supports it
+        response = send_file_ranges(request.environ, path, 'application/pdf', download_name=filename, etag=pdf['etag'])
+        sent = response.content_length if response.status_code in (200, 206) else 0
+    else:
+        response = Response(mimetype='application/pdf')
+        response.headers.set('Content-Disposition', 'attachment', filename=filename)
+        if offload == 'x-accel-redirect':
+            response.headers['X-Accel-Redirect'] = current_app.config['DOWNLOAD_OFFLOAD_PREFIX'] + quote(filename)
+        else:
+            response.headers['X-Sendfile'] = os.path.abspath(path)
+        sent = pdf['size']  # The front-end server sends it; counted as the whole file
+
+    # Counted when the response starts, so an abandoned download still counts in full
+    if request.method != 'HEAD' and sent:
+        PDF_BYTES.labels(filename).inc(sent)
+    return response
+
+
+@site.route('/download/<filename>')
 def download_pdf(filename):
     """Download a PDF file"""
+    # Security: prevent directory traversal
+    if '..' in filename or '/' in filename or '\\' in filename:
+        return "Invalid filename", 400
+
+    # Signed links from /access carry their own authorization
+    signature = request.args.get('sig')
+    if signature is not None:
+        if not valid_download_signature(filename, request.args.get('expires'), signature):
+            return "Link expired or invalid", 403
+        return send_pdf(filename)
+
+    # Older unsigned links fall back to the session
     email = session.get('email')
     access_token = session.get('access_token')
     
@@ -194,21 +536,98 @@ def download_pdf(filename):
     if not email or not access_token:
         return "Unauthorized", 401
     
-    user_data = user_access.get(email)
+    user_data = services().access_store.get(email)
     if not user_data or user_data['access_token'] != access_token:
         return "Unauthorized", 401
     
     if datetime.now() > user_data['expires']:
         return "Access expired", 403
     
-    # Security: prevent directory traversal
-    if '..' in filename or '/' in filename or '\\' in filename:
-        return "Invalid filename", 400
+    return send_pdf(filename)
+
+
+def fulfil_checkout_session(services, checkout_session):
+    """Grant access for a completed checkout; safe to repeat"""
+    email = checkout_session.get('customer_email')
+    session_id = checkout_session.get('id')
     
-    return send_from_directory(PDF_FOLDER, filename, as_attachment=True)
+    if email and session_id and not outlived_access(checkout_session):
+        expires = datetime.now() + timedelta(days=ACCESS_DURATION_DAYS)
+        services.fulfilled_sessions.set(session_id, services.access_store.fulfil(email, session_id, expires))
+        
+        # Here you could send an email with the access token
+        print(f"Access granted to {email}")
+
 
+def handle_webhook_event(services, event):
+    """Process one queued Stripe event (runs on a webhook worker thread)"""
+    if event['type'] == 'checkout.session.completed':
+        fulfil_checkout_session(services, event['data']['object'])
 
-@app.route('/webhook', methods=['POST'])
+
+@site.before_app_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+
+@site.before_app_request
+def enforce_rate_limits():
+    """429 once a client IP or an email has used up its route's limit"""
+    limits = ROUTE_LIMITS.get((request.endpoint, request.method))
+    buckets = services().rate_buckets
+    if not limits or buckets is None:
+        return None
+
+    if request.is_json:
+        email = (request.get_json(silent=True) or {}).get('email')
+    else:
+        email = request.form.get('email')
+    email = email.strip().lower() if isinstance(email, str) else None
+
+    wait = retry_after(buckets, limits, {'ip': client_ip(), 'email': email})
+    if not wait:
+        return None
+    message = 'Too many attempts. Please wait a moment and try again.'
+    if request.endpoint == 'site.login':
+        response = current_app.make_response((render_template('login.html', error=message), 429))
+    else:
+        response = current_app.make_response((jsonify({'error': message}), 429))
+    response.headers['Retry-After'] = str(int(wait) + 1)
+    return response
+
+
+def client_ip():
+    """The client's address. Behind the local nginx it is the last
+    X-Forwarded-For entry (the one nginx added); anyone else's is ignored."""
+    forwarded = request.headers.get('X-Forwarded-For')
+    if forwarded and request.remote_addr in ('127.0.0.1', '::1'):
+        return forwarded.rsplit(',', 1)[-1].strip()
+    return request.remote_addr
+
+
+@site.after_app_request
+def record_request(response):
+    """Per-route request count and latency, for /metrics"""
+    started = g.pop('request_started', None)
+    if started is not None:
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        HTTP_LATENCY.labels(route, request.method).observe(time.perf_counter() - started)
+        HTTP_REQUESTS.labels(route, request.method, response.status_code).inc()
+        snapshots = services().metrics_snapshots
+        if snapshots is not None:
+            snapshots.save()  # At most every few seconds
+    return response
+
+
+@site.before_app_request
+def start_background_workers():
+    """Start the webhook queue workers and the expiry sweeper in this process
+    (each worker process after a fork)"""
+    services().webhook_queue.ensure_started()
+    services().access_sweeper.ensure_started()
+
+
+@site.route('/webhook', methods=['POST'])
 def webhook():
     """Stripe webhook endpoint"""
     payload = request.data
@@ -216,47 +635,72 @@ def webhook():
     
     try:
         event = stripe.Webhook.construct_event(
-            payload, sig_header, STRIPE_WEBHOOK_SECRET
+            payload, sig_header, current_app.config['STRIPE_WEBHOOK_SECRET']
         )
     except ValueError as e:
         return 'Invalid payload', 400
     except stripe.error.SignatureVerificationError as e:
         return 'Invalid signature', 400
     
-    # Handle the checkout.session.completed event
-    if event['type'] == 'checkout.session.completed':
-        session = event['data']['object']
-        
-        # Fulfill the purchase
-        email = session.get('customer_email')
-        session_id = session.get('id')
-        
-        if email and session_id:
-            access_token = secrets.token_urlsafe(32)
-            expires = datetime.now() + timedelta(days=ACCESS_DURATION_DAYS)
-            
-            user_access[email] = {
-                'access_token': access_token,
-                'expires': expires,
-                'session_id': session_id
-            }
-            
-            # Here you could send an email with the access token
-            print(f"Access granted to {email}")
+    # Acknowledge right away; the queue's workers fulfil the purchase.
+    # A retried or replayed event id is already queued and is ignored.
+    if event['type'] in WEBHOOK_EVENT_TYPES:
+        services().webhook_queue.enqueue(event['id'], event['type'], payload.decode('utf-8'))
     
     return jsonify({'status': 'success'})
 
 
-@app.route('/logout')
+@site.route('/internal/stats')
+def internal_stats():
+    """Cache and queue counters (only answered for local requests)"""
+    local_requests_only()
+    lookups = {
+        'store_hits': SESSION_LOOKUPS.labels('store').value,
+        'stripe_calls': SESSION_LOOKUPS.labels('stripe').value,
+    }
+    stripe_calls = {
+        ' '.join(labels): {'count': child.snapshot()[2], 'p50': child.quantile(0.5), 'p95': child.quantile(0.95)}
+        for labels, child in STRIPE_LATENCY.samples()
+    }
+    return jsonify({
+        'fulfilled_sessions': {**services().fulfilled_sessions.stats(), **lookups},
+        'webhook_queue': services().webhook_queue.stats(),
+        'access_store': services().access_store.stats(),
+        'rate_limits': services().rate_buckets.stats() if services().rate_buckets is not None else None,
+        'stripe_api': stripe_calls,
+    })
+
+
+@site.route('/metrics')
+def prometheus_metrics():
+    """Prometheus metrics (only answered for local requests)"""
+    local_requests_only()
+    snapshots = services().metrics_snapshots
+    families = snapshots.merged() if snapshots is not None else snapshot()
+    return Response(render(families), mimetype='text/plain; version=0.0.4')
+
+
+def local_requests_only():
+    """404 unless the request comes from this machine (a scraper or an admin over SSH).
+    Requests proxied by nginx also arrive from 127.0.0.1, but carry X-Forwarded-For."""
+    if request.remote_addr not in ('127.0.0.1', '::1') or 'X-Forwarded-For' in request.headers:
+        abort(404)
+
+
+@site.route('/logout')
 def logout():
     """Logout user"""
     session.clear()
-    return redirect(url_for('index'))
+    return redirect(url_for('.index'))
 
 
 if __name__ == '__main__':
+    # Development server only; production runs wsgi.py under gunicorn (see gunicorn.conf.py)
+    app = create_app()
+    print_config_status(app)
+
     # Create PDF folder if it doesn't exist
-    os.makedirs(PDF_FOLDER, exist_ok=True)
+    os.makedirs(app.config['PDF_FOLDER'], exist_ok=True)
     
     # Run the app
     app.run(debug=True, port=5000)
@@ -0,0 +1,54 @@
+"""
+TTL Cache
+A small thread-safe in-process cache whose entries expire after `ttl`
+seconds, bounded to `max_size` entries (least recently used go first).
+Hit / miss counters are kept for the stats and metrics endpoints.
+"""
+
+import time
+import threading
+from collections import OrderedDict
+
+
+class TTLCache:
+    """Expiring, size-bounded mapping with hit/miss counters."""
+
+    def __init__(self, ttl, max_size=10000):
+        self.ttl = ttl
+        self.max_size = max_size
+        self.lock = threading.Lock()
+        self.items = OrderedDict()  # key -> (expires_at, value)
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        """The cached value, or None if absent or expired."""
+        now = time.monotonic()
+        with self.lock:
+            item = self.items.get(key)
+            if item is None or item[0] <= now:
+                if item is not None:
+                    del self.items[key]
+                self.misses += 1
+                return None
+            self.items.move_to_end(key)
+            self.hits += 1
+            return item[1]
+
+    def set(self, key, value):
+        with self.lock:
+            self.items[key] = (time.monotonic() + self.ttl, value)
+            self.items.move_to_end(key)
+            while len(self.items) > self.max_size:
+                self.items.popitem(last=False)
+
+    def discard(self, key):
+        with self.lock:
+            self.items.pop(key, None)
+
+    def __len__(self):
+        return len(self.items)
+
+    def stats(self):
+        with self.lock:
+            return {'size': len(self.items), 'hits': self.hits, 'misses': self.misses}
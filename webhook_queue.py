@@ -0,0 +1,153 @@
+"""
+Webhook Queue
+A durable SQLite queue between the /webhook endpoint and the code that acts
+on Stripe events.
+
+- enqueue() stores the verified event under its Stripe event id and returns
+  at once, so Stripe gets its 200 in milliseconds even during a burst.
+  The event id is the primary key: a retried or replayed event is ignored.
+- A small pool of worker threads (per process) claims due events, runs the
+  handler and marks them done. A failing event is retried with exponential
+  backoff and given up after MAX_ATTEMPTS.
+- A claim is a lease: if a worker dies mid-event, the event becomes due
+  again once the lease runs out, in whichever process looks first.
+"""
+
+import json
+import time
+import random
+import sqlite3
+import threading
+
+from process_local import LocalConnections, BackgroundThreads
+
+MAX_ATTEMPTS = 8
+BASE_DELAY = 2.0  # Seconds before the first retry; doubles on every attempt
+MAX_DELAY = 15 * 60
+LEASE_SECONDS = 5 * 60
+POLL_INTERVAL = 1.0  # Also picks up events queued by other processes
+KEEP_DONE_SECONDS = 30 * 24 * 60 * 60  # Longer than Stripe keeps retrying
+PRUNE_INTERVAL = 60 * 60
+
+
+class WebhookQueue:
+    """Durable, deduplicating event queue with a worker thread pool."""
+
+    SCHEMA = (
+        """CREATE TABLE IF NOT EXISTS webhook_events (
+            event_id TEXT PRIMARY KEY,
+            type TEXT NOT NULL,
+            payload TEXT NOT NULL,
+            status TEXT NOT NULL DEFAULT 'pending',
+            attempts INTEGER NOT NULL DEFAULT 0,
+            next_attempt_at REAL NOT NULL,
+            locked_until REAL,
+            last_error TEXT,
+            received_at REAL NOT NULL,
+            processed_at REAL
+        )""",
+        "CREATE INDEX IF NOT EXISTS webhook_due_idx ON webhook_events (status, next_attempt_at)",
+    )
+    ENQUEUE_SQL = (
+        "INSERT OR IGNORE INTO webhook_events (event_id, type, payload, next_attempt_at, received_at) "
+        "VALUES (?, ?, ?, ?, ?)"
+    )
+    CLAIM_SQL = (
+        "SELECT event_id, type, payload, attempts FROM webhook_events "
+        "WHERE (status = 'pending' AND next_attempt_at <= ?) OR (status = 'processing' AND locked_until <= ?) "
+        "ORDER BY next_attempt_at LIMIT 1"
+    )
+    LOCK_SQL = "UPDATE webhook_events SET status = 'processing', locked_until = ? WHERE event_id = ?"
+    DONE_SQL = ("UPDATE webhook_events SET status = 'done', attempts = attempts + 1, processed_at = ?, "
+                "locked_until = NULL, last_error = NULL WHERE event_id = ?")
+    RETRY_SQL = ("UPDATE webhook_events SET status = ?, attempts = ?, next_attempt_at = ?, "
+                 "locked_until = NULL, last_error = ? WHERE event_id = ?")
+    PRUNE_SQL = "DELETE FROM webhook_events WHERE status = 'done' AND processed_at < ?"
+    STATS_SQL = "SELECT status, COUNT(*) FROM webhook_events GROUP BY status"
+
+    def __init__(self, path, handler, workers=2):
+        self.path = path
+        self.handler = handler  # handler(event_dict); raise to retry
+        self.workers = workers
+        self.wakeup = threading.Event()
+        self.last_prune = 0.0
+        # Autocommit mode; transactions are opened explicitly where needed.
+        # FULL: an acknowledged event must survive a crash
+        self.connections = LocalConnections(path, self.SCHEMA, synchronous='FULL', autocommit=True)
+        self.background = BackgroundThreads(self._work, [f'webhook-worker-{i}' for i in range(workers)],
+                                            wake=self.wakeup.set)
+        self.stopping = self.background.stopping
+
+    def connection(self):
+        return self.connections.get()
+
+    def enqueue(self, event_id, event_type, payload):
+        """Store an event; False if this event id was already queued."""
+        now = time.time()
+        cursor = self.connection().execute(self.ENQUEUE_SQL, (event_id, event_type, payload, now, now))
+        self.wakeup.set()
+        return cursor.rowcount == 1
+
+    def ensure_started(self):
+        """Start the workers in this process (again after a fork)."""
+        self.background.ensure_started()
+
+    def stop(self, timeout=10):
+        self.background.stop(timeout)
+
+    def _claim(self):
+        conn = self.connection()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")  # One claimer at a time across processes
+        try:
+            row = conn.execute(self.CLAIM_SQL, (now, now)).fetchone()
+            if row:
+                conn.execute(self.LOCK_SQL, (now + LEASE_SECONDS, row[0]))
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return row
+
+    def _work(self):
+        while not self.stopping.is_set():
+            try:
+                job = self._claim()
+                if job is None:
+                    self._prune_if_due()
+                    self.wakeup.wait(POLL_INTERVAL)
+                    self.wakeup.clear()
+                    continue
+                self._run(*job)
+            except sqlite3.Error as e:
+                print(f"Webhook queue error: {e}")
+                self.stopping.wait(POLL_INTERVAL)
+
+    def _run(self, event_id, event_type, payload, attempts):
+        conn = self.connection()
+        try:
+            self.handler(json.loads(payload))
+        except Exception as e:
+            attempts += 1
+            if attempts >= MAX_ATTEMPTS:
+                status, next_at = 'failed', time.time()
+                print(f"Webhook {event_id} ({event_type}) failed for good after {attempts} attempts: {e}")
+            else:
+                # Exponential backoff with jitter, so a burst of failures does not retry in lockstep
+                delay = min(MAX_DELAY, BASE_DELAY * 2 ** (attempts - 1)) * random.uniform(0.8, 1.2)
+                status, next_at = 'pending', time.time() + delay
+                print(f"Webhook {event_id} ({event_type}) failed (attempt {attempts}), retrying in {delay:.0f}s: {e}")
+            conn.execute(self.RETRY_SQL, (status, attempts, next_at, str(e), event_id))
+        else:
+            conn.execute(self.DONE_SQL, (time.time(), event_id))
+
+    def _prune_if_due(self):
+        # Done events are kept a while so late replays are still recognised
+        now = time.time()
+        if now - self.last_prune >= PRUNE_INTERVAL:
+            self.last_prune = now
+            self.connection().execute(self.PRUNE_SQL, (now - KEEP_DONE_SECONDS,))
+
+    def stats(self):
+        """Number of events per status."""
+        return dict(self.connection().execute(self.STATS_SQL).fetchall())
@@ -0,0 +1,29 @@
+"""
+WSGI Entry Point
+The production server for stripe_server's Flask app:
+
+    gunicorn -c gunicorn.conf.py wsgi:app      Linux / the VPS (workers x threads, see gunicorn.conf.py)
+    python wsgi.py                              Windows or a quick local run, under waitress
+
+`python stripe_server.py` stays the debug server with the reloader, for
+development only: it handles one request at a time.
+
+Creating the app is cheap (no database, catalog or Stripe I/O happens until
+a request needs it), so with gunicorn's preload_app the master imports it
+once and every forked worker starts serving at once.
+"""
+
+import os
+
+from stripe_server import create_app
+
+app = create_app()
+
+
+if __name__ == '__main__':
+    from waitress import serve
+
+    serve(app,
+          host=os.environ.get('HOST', '127.0.0.1'),
+          port=int(os.environ.get('PORT', '8000')),
+          threads=int(os.environ.get('WEB_THREADS', '16')))